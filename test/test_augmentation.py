@@ -0,0 +1,83 @@
+import unittest
+
+import numpy as np
+
+import xnmt.augmentation
+import xnmt.batcher
+import xnmt.input
+from xnmt.vocab import Vocab
+
+class TestAugmentation(unittest.TestCase):
+
+  def setUp(self):
+    self.rng = np.random.RandomState(3)
+    self.array_batch = xnmt.batcher.pad_batch([xnmt.input.ArrayInput(np.ones((8, l), dtype=np.float32)) for l in (10, 6)])
+    self.word_batch = xnmt.batcher.pad_batch([xnmt.input.CompactSentenceInput([5] * l + [Vocab.ES]) for l in (9, 4)])
+
+  def test_feature_masking(self):
+    transform = xnmt.augmentation.FeatureMasking(max_feat_width=3, max_time_width=4)
+    batch = transform(self.array_batch, self.rng)
+    self.assertEqual(self.array_batch.np_arr.shape, batch.np_arr.shape)
+    self.assertLess(batch.np_arr.sum(), self.array_batch.np_arr.sum())
+    self.assertEqual(self.array_batch.mask.np_arr.tolist(), batch.mask.np_arr.tolist())
+    self.assertEqual(80 + 48, self.array_batch.np_arr.sum())
+
+  def test_feature_noise(self):
+    batch = xnmt.augmentation.FeatureNoise(stddev=0.5)(self.array_batch, self.rng)
+    self.assertEqual(np.float32, batch.np_arr.dtype)
+    self.assertTrue(np.all(batch.np_arr[1, :, 6:] == 0.0))
+    self.assertFalse(np.allclose(batch.np_arr[0], 1.0))
+
+  def test_truncation(self):
+    batch = xnmt.augmentation.Truncation(max_len=6)(self.word_batch, self.rng)
+    self.assertEqual([[5, 5, 5, 5, 5, Vocab.ES], [5, 5, 5, 5, Vocab.ES, Vocab.ES]], batch.np_arr.tolist())
+    self.assertEqual([[0, 0, 0, 0, 0, 0], [0, 0, 0, 0, 0, 1]], batch.mask.np_arr.tolist())
+    self.assertEqual(10, len(self.word_batch[0]))
+
+  def test_truncation_mask(self):
+    # the mask caches of the original batch must not carry over to the shorter transformed batch
+    xnmt.batcher.prepare_batch(self.word_batch)
+    short_batch = xnmt.batcher.pad_batch([xnmt.input.CompactSentenceInput([5] * l + [Vocab.ES]) for l in (3, 1)])
+    batch = xnmt.batcher.prepare_batch(xnmt.augmentation.Truncation(max_len=3)(self.word_batch, self.rng))
+    self.assertIsNot(self.word_batch.mask, batch.mask)
+    self.assertIsNone(batch.mask)
+    batch = xnmt.batcher.prepare_batch(xnmt.augmentation.Truncation(max_len=4)(short_batch, self.rng))
+    self.assertEqual([[0, 0, 0, 0], [0, 0, 1, 1]], batch.mask.np_arr.tolist())
+    self.assertEqual([False, False, True, True], [batch.mask.any_masked(t) for t in range(4)])
+
+  def test_trailing_padding_dropped(self):
+    unmasked = np.array([[True, True, False, False], [True, False, False, False]])
+    batch = xnmt.augmentation.make_batch(self.word_batch, np.zeros((2, 4), dtype=np.int32), unmasked)
+    self.assertEqual((2, 2), batch.np_arr.shape)
+    self.assertEqual([[0, 0], [0, 1]], batch.mask.np_arr.tolist())
+    self.assertEqual(2, len(batch[0]))
+
+  def test_annotated_length_change(self):
+    sents = [xnmt.input.SentenceInput([5] * l + [Vocab.ES]) for l in (5, 2)]
+    for sent in sents:
+      sent.annotate("segment", np.array([0, 1], dtype=np.int32))
+    batch = xnmt.batcher.pad_batch(sents)
+    self.assertEqual(sents[0].annotation, xnmt.augmentation.TokenNoise(prob=1.0, replacement_id=3)(batch, self.rng)[0].annotation)
+    with self.assertRaises(RuntimeError):
+      xnmt.augmentation.Truncation(max_len=3)(batch, self.rng)
+
+  def test_subsampling(self):
+    batch = xnmt.augmentation.Subsampling(factor=2)(self.array_batch, self.rng)
+    self.assertEqual((2, 8, 5), batch.np_arr.shape)
+    self.assertEqual(3, int((batch.mask.np_arr[1] == 0).sum()))
+
+  def test_token_noise(self):
+    batch = xnmt.augmentation.TokenNoise(prob=1.0, replacement_id=3)(self.word_batch, self.rng)
+    self.assertEqual([3] * 9 + [Vocab.ES], batch[0].words.tolist())
+    self.assertEqual([3] * 4 + [Vocab.ES] * 6, batch[1].words.tolist())
+    self.assertEqual([5] * 9 + [Vocab.ES], self.word_batch[0].words.tolist())
+
+  def test_seeded(self):
+    transforms = [xnmt.augmentation.FeatureMasking(max_feat_width=3, max_time_width=4),
+                  xnmt.augmentation.FeatureNoise()]
+    first = xnmt.augmentation.apply_transforms(self.array_batch, transforms, np.random.RandomState(7))
+    second = xnmt.augmentation.apply_transforms(self.array_batch, transforms, np.random.RandomState(7))
+    self.assertTrue(np.array_equal(first.np_arr, second.np_arr))
+
+if __name__ == '__main__':
+  unittest.main()
@@ -1,5 +1,8 @@
 import unittest
 
+import numpy as np
+import dynet as dy
+
 import xnmt.batcher
 import xnmt.input
 import xnmt.events
@@ -19,6 +22,170 @@ class TestBatcher(unittest.TestCase):
     self.assertEqual([[0, 0, 0, 0, 1, 1], [0, 0, 0, 0, 0, 1], [0, 0, 0, 0, 0, 0]], [x.words for x in src[1]])
     self.assertEqual([[0, 0, 2, 2], [0, 0, 0, 2], [0, 0, 0, 0]], [x.words for x in trg[1]])
 
+  def test_batch_src_compact(self):
+    src_sents = [xnmt.input.CompactSentenceInput([0] * i) for i in range(1,7)]
+    trg_sents = [xnmt.input.CompactSentenceInput([0] * ((i+3)%6 + 1)) for i in range(1,7)]
+    my_batcher = xnmt.batcher.SrcBatcher(batch_size=3, src_pad_token=1, trg_pad_token=2)
+    src, trg = my_batcher.pack(src_sents, trg_sents)
+    self.assertEqual([[0, 1, 1], [0, 0, 1], [0, 0, 0]], [x.words.tolist() for x in src[0]])
+    self.assertEqual([[0, 0, 0, 0, 0, 2], [0, 0, 0, 0, 0, 0], [0, 2, 2, 2, 2, 2]], [x.words.tolist() for x in trg[0]])
+    self.assertEqual([[0, 0, 0, 0, 1, 1], [0, 0, 0, 0, 0, 1], [0, 0, 0, 0, 0, 0]], [x.words.tolist() for x in src[1]])
+    self.assertEqual([[0, 0, 2, 2], [0, 0, 0, 2], [0, 0, 0, 0]], [x.words.tolist() for x in trg[1]])
+
+  def test_pad_compact_matrix(self):
+    sents = [xnmt.input.CompactSentenceInput([3] * i) for i in (2, 4, 1)]
+    batch = xnmt.batcher.pad_batch(sents, pad_token=1)
+    self.assertEqual([[3, 3, 1, 1], [3, 3, 3, 3], [3, 1, 1, 1]], batch.np_arr.tolist())
+    self.assertEqual([[0, 0, 1, 1], [0, 0, 0, 0], [0, 1, 1, 1]], batch.mask.np_arr.tolist())
+    self.assertEqual([3, 3, 1, 1], batch[0].words.tolist())
+    self.assertIs(batch[0].words.base, batch[1].words.base)
+    padded_sents, mask = xnmt.batcher.pad(sents, pad_token=1)
+    self.assertEqual(batch.np_arr.tolist(), padded_sents.np_arr.tolist())
+    self.assertIs(padded_sents.mask, mask)
+
+  def test_pad_list_matrix(self):
+    sents = [xnmt.input.SimpleSentenceInput([3] * 2), xnmt.input.CompactSentenceInput([4] * 3),
+             xnmt.input.SentenceInput([5])]
+    sents[2].annotate("segment", [0])
+    batch = xnmt.batcher.pad_batch(sents, pad_token=1)
+    self.assertEqual([[3, 3, 1], [4, 4, 4], [5, 1, 1]], batch.np_arr.tolist())
+    self.assertEqual([3, 3, 1], batch[0].words)
+    self.assertIs(batch.np_arr, batch[1].words.base)
+    self.assertEqual({"segment": [0]}, batch[2].annotation)
+    self.assertIsNone(xnmt.batcher.pad_batch([xnmt.input.SimpleSentenceInput(["a"]), xnmt.input.SimpleSentenceInput([])]).np_arr)
+
+  def test_pad_array(self):
+    sents = [xnmt.input.ArrayInput(np.ones((2, i), dtype=np.float32)) for i in (3, 1)]
+    batch = xnmt.batcher.pad_batch(sents)
+    self.assertEqual((2, 2, 3), batch.np_arr.shape)
+    self.assertEqual(np.float32, batch.np_arr.dtype)
+    self.assertEqual([[1, 0, 0], [1, 0, 0]], batch[1].nparr.tolist())
+    self.assertEqual([[0, 0, 0], [0, 1, 1]], batch.mask.np_arr.tolist())
+
+  def test_bucket_batcher(self):
+    src_sents = [xnmt.input.SimpleSentenceInput([0] * (i % 9 + 1)) for i in range(40)]
+    trg_sents = [xnmt.input.SimpleSentenceInput([0] * (i % 5 + 1)) for i in range(40)]
+    my_batcher = xnmt.batcher.BucketBatcher(batch_size=4, src_boundaries=[3, 6], trg_boundaries=[2])
+    src, trg = my_batcher.pack(src_sents, trg_sents)
+    self.assertEqual(40, sum(len(batch) for batch in src))
+    for src_batch, trg_batch in zip(src, trg):
+      src_lens = [len(sent) - (0 if src_batch.mask is None else int(np.count_nonzero(src_batch.mask.np_arr[i])))
+                  for i, sent in enumerate(src_batch)]
+      trg_lens = [len(sent) - (0 if trg_batch.mask is None else int(np.count_nonzero(trg_batch.mask.np_arr[i])))
+                  for i, sent in enumerate(trg_batch)]
+      self.assertEqual(1, len(set(np.searchsorted([3, 6], src_lens))))
+      self.assertEqual(1, len(set(np.searchsorted([2], trg_lens))))
+    self.assertEqual(xnmt.batcher.padding_ratio(src), my_batcher.padding_ratio[0])
+    self.assertTrue(0.0 <= my_batcher.padding_ratio[1] < 1.0)
+
+  def test_bucket_batcher_auto_boundaries(self):
+    src_sents = [xnmt.input.SimpleSentenceInput([0] * (i % 17 + 1)) for i in range(100)]
+    trg_sents = [xnmt.input.SimpleSentenceInput([0] * (i % 13 + 1)) for i in range(100)]
+    bucket_batcher = xnmt.batcher.BucketBatcher(batch_size=8, num_buckets=4)
+    src, trg = bucket_batcher.pack(src_sents, trg_sents)
+    self.assertEqual(100, sum(len(batch) for batch in trg))
+    shuffle_batcher = xnmt.batcher.SentShuffleBatcher(batch_size=8)
+    shuffle_src, shuffle_trg = shuffle_batcher.pack(src_sents, trg_sents)
+    self.assertLess(bucket_batcher.padding_ratio[0], xnmt.batcher.padding_ratio(shuffle_src))
+
+  def test_padded_word_batcher(self):
+    src_sents = [xnmt.input.SimpleSentenceInput([0] * (i % 9 + 1)) for i in range(30)] + \
+                [xnmt.input.SimpleSentenceInput([0] * 40)]
+    trg_sents = [xnmt.input.SimpleSentenceInput([0] * (i % 5 + 1)) for i in range(31)]
+    my_batcher = xnmt.batcher.PaddedWordBatcher(padded_words_per_batch=30, max_sents_per_batch=5)
+    src, trg = my_batcher.pack(src_sents, trg_sents)
+    self.assertEqual(31, sum(len(batch) for batch in src))
+    for src_batch, trg_batch in zip(src, trg):
+      self.assertLessEqual(len(src_batch), 5)
+      if len(src_batch) > 1:
+        self.assertLessEqual(len(src_batch) * (len(src_batch[0]) + len(trg_batch[0])), 30)
+    self.assertEqual([40], [len(batch[0]) for batch in src if len(batch) == 1 and len(batch[0]) > 30])
+
+  def test_pool_sort_batcher(self):
+    src_sents = [xnmt.input.SimpleSentenceInput([0] * (i % 7 + 1)) for i in range(50)]
+    trg_sents = [xnmt.input.SimpleSentenceInput([0] * (i % 3 + 1)) for i in range(50)]
+    my_batcher = xnmt.batcher.PoolSortBatcher(batch_size=5, pool_size=20)
+    stream = my_batcher.pack_stream(iter(zip(src_sents, trg_sents)))
+    batch_pairs = list(stream)
+    self.assertEqual(50, sum(len(src_batch) for src_batch, _ in batch_pairs))
+    self.assertEqual(10, len(batch_pairs))
+    pool_lengths = [sorted(len(sent) for sent in src_sents[start:start+20]) for start in (0, 20, 40)]
+    # each pool of 4 (or 2) batches holds exactly the sents of one pool, sorted into batches
+    for pool_i, pool_batches in enumerate([batch_pairs[0:4], batch_pairs[4:8], batch_pairs[8:10]]):
+      batches = sorted(pool_batches, key=lambda b: len(b[0][0]))
+      real_lengths = [len(sent) - (0 if src_batch.mask is None else int(np.count_nonzero(src_batch.mask.np_arr[i])))
+                      for src_batch, _ in batches for i, sent in enumerate(src_batch)]
+      self.assertEqual(pool_lengths[pool_i], sorted(real_lengths))
+    src, trg = my_batcher.pack(src_sents, trg_sents)
+    self.assertEqual(10, len(src))
+
+  def test_mask_expr_cache(self):
+    mask = xnmt.batcher.Mask(np.array([[0., 0., 1.], [0., 0., 0.]]))
+    dy.renew_cg()
+    self.assertFalse(mask.any_masked(1))
+    self.assertTrue(mask.any_masked(2))
+    self.assertFalse(mask.all_masked(2))
+    keep = mask.cached_expr(("keep", 2), lambda: dy.inputTensor([[1.0, 0.0]], batched=True))
+    self.assertIs(keep, mask.cached_expr(("keep", 2), lambda: None))
+    dy.renew_cg()
+    self.assertIsNone(mask.cached_expr(("keep", 2), lambda: None))
+    self.assertIs(mask, mask.reversed().reversed())
+    self.assertEqual([[1., 0., 0.], [0., 0., 0.]], mask.reversed().np_arr.tolist())
+
+  def test_repack_cached_lengths(self):
+    src_sents = [xnmt.input.SimpleSentenceInput([0] * (i % 9 + 1)) for i in range(60)]
+    trg_sents = [xnmt.input.SimpleSentenceInput([0] * (i % 5 + 1)) for i in range(60)]
+    my_batcher = xnmt.batcher.WordSrcBatcher(words_per_batch=30)
+    self.assertIsNot(my_batcher.sent_lengths(src_sents, trg_sents)[0], my_batcher.sent_lengths(src_sents, trg_sents)[0])
+    my_batcher.cache_corpus_data = True
+    src_len, _ = my_batcher.sent_lengths(src_sents, trg_sents)
+    self.assertIs(src_len, my_batcher.sent_lengths(src_sents, trg_sents)[0])
+    self.assertEqual([len(sent) for sent in src_sents], src_len.tolist())
+    first = my_batcher.pack(src_sents, trg_sents)
+    second = my_batcher.pack(src_sents, trg_sents)
+    self.assertEqual(sum(len(b) for b in first[0]), sum(len(b) for b in second[0]))
+    src_sents = [xnmt.input.SimpleSentenceInput([i + 10] * (i % 9 + 1)) for i in range(60)]
+    shuffle_batcher = xnmt.batcher.SentShuffleBatcher(batch_size=6)
+    compositions = set()
+    for _ in range(5):
+      src, _ = shuffle_batcher.pack(src_sents, trg_sents)
+      compositions.add(tuple(sorted(tuple(sorted(sent[0] for sent in batch)) for batch in src)))
+    self.assertGreater(len(compositions), 1)
+
+  def test_copy_without_cache(self):
+    src_sents = [xnmt.input.SimpleSentenceInput([0] * (i % 9 + 1)) for i in range(20)]
+    my_batcher = xnmt.batcher.SrcBatcher(batch_size=4)
+    my_batcher.cache_corpus_data = True
+    my_batcher.pack(src_sents, src_sents)
+    batcher_copy = my_batcher.copy_without_cache()
+    self.assertIsNone(batcher_copy._length_cache)
+    self.assertIsNone(batcher_copy._sort_key_cache)
+    self.assertIsNotNone(my_batcher._sort_key_cache)
+    self.assertEqual(4, batcher_copy.batch_size)
+    src, _ = batcher_copy.pack(src_sents, src_sents)
+    self.assertEqual(20, sum(len(batch) for batch in src))
+    self.assertIsNot(my_batcher._sort_key_cache, batcher_copy._sort_key_cache)
+
+  def test_memory_budget_batcher(self):
+    src_sents = [xnmt.input.SimpleSentenceInput([0] * (i % 9 + 1)) for i in range(30)] + \
+                [xnmt.input.SimpleSentenceInput([0] * 200) for _ in range(4)]
+    trg_sents = [xnmt.input.SimpleSentenceInput([0] * (i % 5 + 1)) for i in range(30)] + \
+                [xnmt.input.SimpleSentenceInput([0] * 150) for _ in range(4)]
+    my_batcher = xnmt.batcher.MemoryBudgetBatcher(batch_size=8, memory_budget=20.0, layer_dim=64, trg_vocab_size=1000)
+    src, trg = my_batcher.pack(src_sents, trg_sents)
+    self.assertEqual(34, sum(len(batch) for batch in src))
+    self.assertGreater(my_batcher.num_split_batches, 0)
+    for src_batch, trg_batch in zip(src, trg):
+      estimate = my_batcher.estimate_memory(len(src_batch), len(src_batch[0]), len(trg_batch[0]))
+      self.assertTrue(estimate <= 20.0 or len(src_batch) == 1)
+
+  def test_prepare_batch(self):
+    sents = [xnmt.input.SimpleSentenceInput([5] * i) for i in (2, 3)]
+    batch = xnmt.batcher.prepare_batch(xnmt.batcher.pad_batch(sents, pad_token=1))
+    self.assertEqual([[5, 5, 1], [5, 5, 5]], batch.np_arr.tolist())
+    self.assertIsNotNone(batch.mask._any_masked_col)
+    self.assertIsNotNone(batch.mask.reversed()._all_masked_col)
+
   def test_batch_word_src(self):
     src_sents = [xnmt.input.SimpleSentenceInput([0] * i) for i in range(1,7)]
     trg_sents = [xnmt.input.SimpleSentenceInput([0] * ((i+3)%6 + 1)) for i in range(1,7)]
@@ -0,0 +1,71 @@
+import unittest
+
+import numpy as np
+
+from xnmt.data_parallel import DataParallelGroup
+
+class ArrayParam(object):
+  def __init__(self, value):
+    self.value = np.asarray(value, dtype=np.float32)
+  def as_array(self):
+    return self.value.copy()
+  def set_value(self, value):
+    self.value = np.asarray(value, dtype=np.float32).copy()
+  init_from_array = set_value
+
+class ArrayParamCollection(object):
+  def __init__(self, params, lookup_params):
+    self.params, self.lookup_params = params, lookup_params
+  def parameters_list(self):
+    return self.params
+  def lookup_parameters_list(self):
+    return self.lookup_params
+
+class TestDataParallelGroup(unittest.TestCase):
+
+  def test_average(self):
+    param = ArrayParam(np.zeros((2, 3)))
+    lookup_param = ArrayParam(np.zeros((4, 2)))
+    group = DataParallelGroup(ArrayParamCollection([param], [lookup_param]), num_processes=3)
+    def worker():
+      param.set_value(np.full((2, 3), group.rank * 3.0))
+      lookup_param.set_value(np.full((4, 2), group.rank * 1.0))
+      message = group.exchange((group.rank, {"loss": 1.0}))
+      if message != "done" or not np.allclose(param.as_array(), 3.0) or not np.allclose(lookup_param.as_array(), 1.0):
+        raise RuntimeError("unexpected state after synchronization")
+    group.start(worker)
+    try:
+      messages = group.gather()
+      self.assertEqual([1, 2], sorted(rank for rank, _ in messages))
+      group.average_params()
+      self.assertTrue(np.allclose(param.as_array(), 3.0))
+      self.assertTrue(np.allclose(lookup_param.as_array(), 1.0))
+      group.broadcast("done")
+    finally:
+      group.join()
+
+  def test_reseed_per_rank(self):
+    param = ArrayParam(np.zeros(2))
+    group = DataParallelGroup(ArrayParamCollection([param], []), num_processes=3, seed=7)
+    group.start(lambda: group.exchange((group.rank, np.random.randint(1000000))))
+    try:
+      draws = dict(group.gather())
+      draws[0] = np.random.randint(1000000)
+      group.broadcast(None)
+    finally:
+      group.join()
+    for rank in range(3):
+      self.assertEqual(np.random.RandomState(7 + rank).randint(1000000), draws[rank])
+
+  def test_worker_failure(self):
+    def worker():
+      raise RuntimeError("worker failure")
+    group = DataParallelGroup(ArrayParamCollection([ArrayParam(np.zeros(2))], []), num_processes=2)
+    group.start(worker)
+    with self.assertRaises(RuntimeError):
+      group.join()
+    group.start(worker)
+    group.join(raise_on_failure=False)
+
+if __name__ == '__main__':
+  unittest.main()
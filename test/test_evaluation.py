@@ -27,5 +27,13 @@ class TestBLEU(unittest.TestCase):
     act_bleu = bleu.evaluate_fast(self.ref_id, self.hyp_id)
     self.assertEqual(act_bleu, exp_bleu)
 
+  def test_bleu_cached_reference(self):
+    bleu = evaluator.BLEUEvaluator(ngram=2)
+    ref = [self.ref[0], "the cat sat down".split()]
+    hyps = [[self.hyp[0], "the cat sat".split()], [self.ref[0], "a cat sat down".split()]]
+    for hyp in hyps:
+      self.assertEqual(evaluator.BLEUEvaluator(ngram=2).evaluate(ref, hyp).value(), bleu.evaluate(ref, hyp).value())
+    self.assertIs(ref, bleu._cached_ref)
+
 if __name__ == '__main__':
   unittest.main()
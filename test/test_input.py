@@ -0,0 +1,431 @@
+import unittest
+
+import os, shutil, tempfile, gzip, bz2, threading
+
+import numpy as np
+
+import xnmt.input
+from xnmt.vocab import Vocab
+from xnmt.training_corpus import BilingualTrainingCorpus
+from xnmt.prefetch import BackgroundIterator, BackgroundTask
+
+class TestBinaryIdReader(unittest.TestCase):
+
+  def setUp(self):
+    self.out_dir = tempfile.mkdtemp()
+    self.vocab = Vocab(vocab_file="examples/data/head.en.vocab")
+    self.prefix = os.path.join(self.out_dir, "head.en")
+    xnmt.input.compile_binary_corpus("examples/data/head.en", self.prefix, self.vocab)
+
+  def test_same_as_plain_text(self):
+    plain_reader = xnmt.input.PlainTextReader(vocab=self.vocab)
+    binary_reader = xnmt.input.BinaryIdReader(vocab=self.vocab)
+    plain_sents = [sent.words for sent in plain_reader.read_sents("examples/data/head.en")]
+    binary_sents = [sent.words.tolist() for sent in binary_reader.read_sents(self.prefix)]
+    self.assertEqual(plain_sents, binary_sents)
+    self.assertEqual(plain_reader.count_sents("examples/data/head.en"), binary_reader.count_sents(self.prefix))
+
+  def test_filtered(self):
+    plain_reader = xnmt.input.PlainTextReader(vocab=self.vocab)
+    binary_reader = xnmt.input.BinaryIdReader(vocab=self.vocab)
+    plain_sents = [sent.words for sent in plain_reader.read_sents("examples/data/head.en", filter_ids=[5, 1, 3])]
+    binary_sents = [sent.words.tolist() for sent in binary_reader.read_sents(self.prefix, filter_ids=[5, 1, 3])]
+    self.assertEqual(plain_sents, binary_sents)
+
+  def tearDown(self):
+    shutil.rmtree(self.out_dir)
+
+class TestLineIndex(unittest.TestCase):
+
+  def setUp(self):
+    self.out_dir = tempfile.mkdtemp()
+    self.text_file = os.path.join(self.out_dir, "head.ja")
+    shutil.copyfile("examples/data/head.ja", self.text_file)
+
+  def test_count(self):
+    indexed_reader = xnmt.input.PlainTextReader(line_index=True)
+    self.assertEqual(xnmt.input.PlainTextReader().count_sents(self.text_file), indexed_reader.count_sents(self.text_file))
+    self.assertTrue(os.path.isfile(self.text_file + xnmt.input.LineIndex.INDEX_EXT))
+
+  def test_filtered(self):
+    plain_lines = list(xnmt.input.PlainTextReader().iterate_filtered(self.text_file, filter_ids=[7, 0, 2, 3]))
+    indexed_lines = list(xnmt.input.PlainTextReader(line_index=True).iterate_filtered(self.text_file, filter_ids=[7, 0, 2, 3]))
+    self.assertEqual(4, len(indexed_lines))
+    self.assertEqual(plain_lines, indexed_lines)
+
+  def test_rebuild_on_change(self):
+    reader = xnmt.input.PlainTextReader(line_index=True)
+    num_sents = reader.count_sents(self.text_file)
+    with open(self.text_file, "a") as f:
+      f.write("one more line without newline")
+    os.utime(self.text_file, (0, 0))
+    self.assertEqual(num_sents + 1, reader.count_sents(self.text_file))
+    self.assertEqual([u"one more line without newline"], list(reader.iterate_filtered(self.text_file, [num_sents])))
+
+  def test_index_dir(self):
+    index_dir = os.path.join(self.out_dir, "index")
+    reader = xnmt.input.PlainTextReader(line_index=True, line_index_dir=index_dir)
+    self.assertEqual(10, reader.count_sents(self.text_file))
+    self.assertFalse(os.path.exists(self.text_file + xnmt.input.LineIndex.INDEX_EXT))
+    self.assertTrue(os.path.isfile(xnmt.input.LineIndex.index_file(self.text_file, index_dir)))
+
+  def test_unwritable_index(self):
+    # a file in place of the index directory makes writing the index fail
+    not_a_dir = os.path.join(self.out_dir, "not_a_dir")
+    with open(not_a_dir, "w") as f:
+      f.write("")
+    reader = xnmt.input.PlainTextReader(line_index=True, line_index_dir=not_a_dir)
+    self.assertEqual(10, reader.count_sents(self.text_file))
+    self.assertEqual(["not_a_dir", "head.ja"], sorted(os.listdir(self.out_dir), reverse=True))
+
+  def tearDown(self):
+    shutil.rmtree(self.out_dir)
+
+class TestStreamingCorpusParser(unittest.TestCase):
+
+  def setUp(self):
+    self.out_dir = tempfile.mkdtemp()
+    self.vocab = Vocab(vocab_file="examples/data/head.en.vocab")
+    with open("examples/data/head.en") as f:
+      lines = f.readlines()
+    for shard_i in range(3):
+      for ext in ["src", "trg"]:
+        with open(os.path.join(self.out_dir, "shard%d.%s" % (shard_i, ext)), "w") as f:
+          f.writelines(lines[shard_i*4:(shard_i+1)*4])
+
+  def create_parser(self, train_src, train_trg, **kwargs):
+    training_corpus = BilingualTrainingCorpus(train_src=train_src, train_trg=train_trg,
+                                              dev_src="examples/data/head.en", dev_trg="examples/data/head.en")
+    return xnmt.input.BilingualCorpusParser(training_corpus=training_corpus,
+                                            src_reader=xnmt.input.PlainTextReader(vocab=self.vocab),
+                                            trg_reader=xnmt.input.PlainTextReader(vocab=self.vocab),
+                                            **kwargs)
+
+  def test_same_as_in_memory(self):
+    in_memory = self.create_parser("examples/data/head.en", "examples/data/head.en", max_src_len=15)
+    streaming = self.create_parser("examples/data/head.en", "examples/data/head.en", max_src_len=15, stream_window=3)
+    self.assertTrue(streaming.is_streaming())
+    self.assertIsNone(streaming.training_corpus.train_src_data)
+    self.assertEqual(len(in_memory.training_corpus.dev_src_data), len(streaming.training_corpus.dev_src_data))
+    windows = list(streaming.iterate_training_windows(streaming.training_corpus))
+    self.assertTrue(all(len(src_window) <= 3 for src_window, _ in windows))
+    streamed_sents = [sent.words for src_window, _ in windows for sent in src_window]
+    self.assertEqual([sent.words for sent in in_memory.training_corpus.train_src_data], streamed_sents)
+
+  def test_training_pairs(self):
+    parser = self.create_parser("examples/data/head.en", "examples/data/head.en", max_src_len=15, stream_window=3)
+    pairs = list(parser.iterate_training_pairs(parser.training_corpus))
+    windows = list(parser.iterate_training_windows(parser.training_corpus))
+    self.assertEqual([sent.words for src_window, _ in windows for sent in src_window],
+                     [src_sent.words for src_sent, _ in pairs])
+
+  def test_shards(self):
+    parser = self.create_parser(os.path.join(self.out_dir, "shard*.src"), os.path.join(self.out_dir, "shard*.trg"),
+                                stream_window=100)
+    self.assertEqual(10, parser.count_train_sents(parser.training_corpus))
+    self.assertEqual(1, len(list(parser.iterate_training_windows(parser.training_corpus))))
+
+  def test_cached_count(self):
+    parser = self.create_parser(os.path.join(self.out_dir, "shard*.src"), os.path.join(self.out_dir, "shard*.trg"),
+                                stream_window=100)
+    self.assertEqual(10, parser.count_train_sents(parser.training_corpus))
+    count_calls = []
+    count_sents = parser.src_reader.count_sents
+    parser.src_reader.count_sents = lambda filename: count_calls.append(filename) or count_sents(filename)
+    self.assertEqual(10, parser.count_train_sents(parser.training_corpus))
+    self.assertEqual([], count_calls)
+    shard_file = os.path.join(self.out_dir, "shard2.src")
+    with open(shard_file, "a") as f:
+      f.write("a\n")
+    self.assertEqual(11, parser.count_train_sents(parser.training_corpus))
+    self.assertEqual([shard_file], count_calls)
+
+  def test_rotate_shards(self):
+    parser = self.create_parser(os.path.join(self.out_dir, "shard*.src"), os.path.join(self.out_dir, "shard*.trg"),
+                                stream_window=100, rotate_shards=True)
+    self.assertEqual([4, 4, 2, 4], [parser.count_train_sents(parser.training_corpus, epoch_num) for epoch_num in range(1, 5)])
+    src_window, _ = next(parser.iterate_training_windows(parser.training_corpus, 3))
+    self.assertEqual(2, len(src_window))
+
+  def test_requires_vocab(self):
+    with self.assertRaises(RuntimeError):
+      xnmt.input.BilingualCorpusParser(training_corpus=None, src_reader=xnmt.input.PlainTextReader(),
+                                       trg_reader=xnmt.input.PlainTextReader(vocab=self.vocab),
+                                       stream_window=10, lazy_read=True)
+
+  def tearDown(self):
+    shutil.rmtree(self.out_dir)
+
+class TestMmapContVecReader(unittest.TestCase):
+
+  def setUp(self):
+    self.out_dir = tempfile.mkdtemp()
+    self.npz_file = os.path.join(self.out_dir, "feats.npz")
+    rng = np.random.RandomState(1)
+    np.savez_compressed(self.npz_file, *[rng.rand(rng.randint(1, 8), 5).astype(np.float32) for _ in range(12)])
+    self.prefix = os.path.join(self.out_dir, "feats")
+
+  def test_same_as_npz(self):
+    xnmt.input.compile_feature_store(self.npz_file, self.prefix, transpose=True)
+    npz_sents = list(xnmt.input.ContVecReader(transpose=True).read_sents(self.npz_file))
+    mmap_reader = xnmt.input.MmapContVecReader()
+    mmap_sents = list(mmap_reader.read_sents(self.prefix))
+    self.assertEqual(len(npz_sents), mmap_reader.count_sents(self.prefix))
+    for npz_sent, mmap_sent in zip(npz_sents, mmap_sents):
+      self.assertEqual(len(npz_sent), len(mmap_sent))
+      np.testing.assert_array_equal(npz_sent.get_array(), mmap_sent.get_array())
+
+  def test_filtered_float16(self):
+    xnmt.input.compile_feature_store(self.npz_file, self.prefix, transpose=True, dtype="float16")
+    npz_sents = list(xnmt.input.ContVecReader(transpose=True).read_sents(self.npz_file, filter_ids=[2, 10]))
+    mmap_sents = list(xnmt.input.MmapContVecReader().read_sents(self.prefix, filter_ids=[10, 2]))
+    self.assertEqual(2, len(mmap_sents))
+    for npz_sent, mmap_sent in zip(npz_sents, mmap_sents):
+      self.assertEqual(np.float16, mmap_sent.get_array().dtype)
+      np.testing.assert_allclose(npz_sent.get_array(), mmap_sent.get_array(), rtol=1e-3)
+
+  def tearDown(self):
+    shutil.rmtree(self.out_dir)
+
+class TestParallelTextReader(unittest.TestCase):
+
+  def create_reader(self, reader_type, **kwargs):
+    reader = reader_type(num_workers=3, **kwargs)
+    reader.PARALLEL_MIN_CHUNK_SIZE = 100
+    return reader
+
+  def test_same_vocab_and_ids(self):
+    sequential_reader = xnmt.input.PlainTextReader()
+    parallel_reader = self.create_reader(xnmt.input.PlainTextReader)
+    self.assertTrue(len(parallel_reader.parallel_chunks("examples/data/train.en")) > 1)
+    sequential_sents = [sent.words for sent in sequential_reader.read_sents("examples/data/train.en")]
+    parallel_sents = [sent.words for sent in parallel_reader.read_sents("examples/data/train.en")]
+    self.assertEqual(sequential_sents, parallel_sents)
+    self.assertEqual(sequential_reader.vocab.i2w, parallel_reader.vocab.i2w)
+
+  def test_frozen_vocab(self):
+    vocab = Vocab(vocab_file="examples/data/head.en.vocab")
+    sequential_sents = [sent.words for sent in xnmt.input.PlainTextReader(vocab=vocab).read_sents("examples/data/train.en")]
+    parallel_sents = [sent.words for sent in self.create_reader(xnmt.input.PlainTextReader, vocab=vocab).read_sents("examples/data/train.en")]
+    self.assertEqual(sequential_sents, parallel_sents)
+
+  def test_segmentation(self):
+    filename = ["examples/data/head-char.ja", "examples/data/head-seg.ja"]
+    sequential_sents = list(xnmt.input.SegmentationTextReader().read_sents(filename))
+    parallel_reader = self.create_reader(xnmt.input.SegmentationTextReader)
+    self.assertTrue(len(parallel_reader.parallel_segmentation_chunks(filename)) > 1)
+    parallel_sents = list(parallel_reader.read_sents(filename))
+    self.assertEqual([sent.words for sent in sequential_sents], [sent.words for sent in parallel_sents])
+    self.assertEqual([sent.annotation["segment"].tolist() for sent in sequential_sents],
+                     [sent.annotation["segment"].tolist() for sent in parallel_sents])
+
+class TestCompactSentenceInput(unittest.TestCase):
+
+  def test_read_compact(self):
+    vocab = Vocab(vocab_file="examples/data/head.en.vocab")
+    plain_sents = list(xnmt.input.PlainTextReader(vocab=vocab).read_sents("examples/data/head.en"))
+    compact_sents = list(xnmt.input.PlainTextReader(vocab=vocab, compact=True).read_sents("examples/data/head.en"))
+    for plain_sent, compact_sent in zip(plain_sents, compact_sents):
+      self.assertEqual(np.int32, compact_sent.words.dtype)
+      self.assertEqual(len(plain_sent), len(compact_sent))
+      self.assertEqual(plain_sent.words, [compact_sent[i] for i in range(len(compact_sent))])
+
+  def test_padded_sent(self):
+    sent = xnmt.input.CompactSentenceInput([6])
+    self.assertEqual([6, 1], sent.get_padded_sent(1, 1).words.tolist())
+    self.assertEqual(np.int32, sent.get_padded_sent(1, 1).words.dtype)
+    self.assertIs(sent, sent.get_padded_sent(1, 0))
+
+  def test_lazy_annotation(self):
+    sent = xnmt.input.SentenceInput([1, 2])
+    self.assertIsNone(sent._annotation)
+    sent.annotate("segment", [1])
+    self.assertEqual({"segment": [1]}, sent.get_padded_sent(0, 2).annotation)
+    unannotated = xnmt.input.SentenceInput([1, 2])
+    self.assertIsNone(unannotated.get_padded_sent(0, 2)._annotation)
+    self.assertIsNone(unannotated._annotation)
+    with self.assertRaises(AttributeError):
+      sent.other_attribute = 1
+
+class TestSampleTrainSents(unittest.TestCase):
+
+  def create_parser(self, vocab, sample_seed, max_src_len=None):
+    training_corpus = BilingualTrainingCorpus(train_src="examples/data/train.en", train_trg="examples/data/train.en",
+                                              dev_src="examples/data/head.en", dev_trg="examples/data/head.en")
+    return xnmt.input.BilingualCorpusParser(training_corpus=training_corpus,
+                                            src_reader=xnmt.input.PlainTextReader(vocab=vocab),
+                                            trg_reader=xnmt.input.PlainTextReader(vocab=vocab),
+                                            sample_train_sents=50, sample_seed=sample_seed, max_src_len=max_src_len)
+
+  def test_reservoir_sample(self):
+    vocab = Vocab(vocab_file="examples/data/head.en.vocab")
+    parser = self.create_parser(vocab, sample_seed=3)
+    src_data = parser.training_corpus.train_src_data
+    self.assertEqual(50, len(src_data))
+    self.assertEqual(10000, parser.train_src_len)
+    self.assertEqual([sent.words for sent in src_data], [sent.words for sent in parser.training_corpus.train_trg_data])
+    all_sents = [sent.words for sent in xnmt.input.PlainTextReader(vocab=vocab).read_sents("examples/data/train.en")]
+    pos = -1
+    for sent in src_data: # sampled sentences must appear in corpus order
+      pos = all_sents.index(sent.words, pos + 1)
+    self.assertEqual([sent.words for sent in src_data],
+                     [sent.words for sent in self.create_parser(vocab, sample_seed=3).training_corpus.train_src_data])
+
+  def test_reservoir_sample_length_filter(self):
+    vocab = Vocab(vocab_file="examples/data/head.en.vocab")
+    src_data = self.create_parser(vocab, sample_seed=3, max_src_len=10).training_corpus.train_src_data
+    self.assertEqual(50, len(src_data))
+    self.assertTrue(all(len(sent) <= 10 for sent in src_data))
+
+  def test_reservoir_sample_global_seed(self):
+    vocab = Vocab(vocab_file="examples/data/head.en.vocab")
+    np.random.seed(5)
+    first = [sent.words for sent in self.create_parser(vocab, sample_seed=None).training_corpus.train_src_data]
+    np.random.seed(5)
+    self.assertEqual(first, [sent.words for sent in self.create_parser(vocab, sample_seed=None).training_corpus.train_src_data])
+
+  def test_sample_nonpositive(self):
+    vocab = Vocab(vocab_file="examples/data/head.en.vocab")
+    parser = self.create_parser(vocab, sample_seed=3)
+    with self.assertRaises(RuntimeError):
+      xnmt.input.BilingualCorpusParser(training_corpus=parser.training_corpus, src_reader=parser.src_reader,
+                                       trg_reader=parser.trg_reader, sample_train_sents=0)
+    parser.sample_train_sents = 0
+    with self.assertRaises(RuntimeError):
+      parser._sample_training_pairs(parser.training_corpus)
+
+  def test_sample_without_vocab(self):
+    parser = self.create_parser(None, sample_seed=3)
+    self.assertEqual(50, len(parser.training_corpus.train_src_data))
+
+class TestReadingCopy(unittest.TestCase):
+
+  def test_reading_copy(self):
+    training_corpus = BilingualTrainingCorpus(train_src="examples/data/head.ja", train_trg="examples/data/head.en",
+                                              dev_src="examples/data/head.ja", dev_trg="examples/data/head.en")
+    parser = xnmt.input.BilingualCorpusParser(training_corpus=training_corpus,
+                                              src_reader=xnmt.input.PlainTextReader(),
+                                              trg_reader=xnmt.input.PlainTextReader(),
+                                              max_num_train_sents=5)
+    src_serialize_params = dict(parser.src_reader.serialize_params)
+    reading_parser = parser.reading_copy()
+    reloaded_corpus = BilingualTrainingCorpus(train_src="examples/data/train.ja", train_trg="examples/data/train.en",
+                                              dev_src="examples/data/head.ja", dev_trg="examples/data/head.en")
+    reading_parser.training_corpus = reloaded_corpus
+    reading_parser._read_training_corpus(reloaded_corpus)
+    self.assertEqual(10000, reading_parser.train_src_len)
+    self.assertEqual(10, parser.train_src_len)
+    self.assertIs(parser.src_reader.vocab, reading_parser.src_reader.vocab)
+    self.assertIsNot(parser.src_reader, reading_parser.src_reader)
+    self.assertEqual(src_serialize_params, parser.src_reader.serialize_params)
+    self.assertIs(training_corpus, parser.training_corpus)
+
+class TestCompressedInput(unittest.TestCase):
+
+  def setUp(self):
+    self.out_dir = tempfile.mkdtemp()
+    with open("examples/data/head.en", "rb") as f:
+      self.data = f.read()
+    self.vocab = Vocab(vocab_file="examples/data/head.en.vocab")
+    self.expected = [sent.words for sent in xnmt.input.PlainTextReader(vocab=self.vocab).read_sents("examples/data/head.en")]
+
+  def write_compressed(self, filename, open_fct):
+    filename = os.path.join(self.out_dir, filename)
+    with open_fct(filename, "wb") as f:
+      f.write(self.data)
+    return filename
+
+  def test_gzip(self):
+    filename = self.write_compressed("head.en.gz", gzip.open)
+    self.assertEqual("gz", xnmt.input.compression_type(filename))
+    self.assertEqual(self.expected, [sent.words for sent in xnmt.input.PlainTextReader(vocab=self.vocab).read_sents(filename)])
+
+  def test_bz2_magic_bytes(self):
+    filename = self.write_compressed("head.en.compressed", bz2.BZ2File)
+    self.assertEqual("bz2", xnmt.input.compression_type(filename))
+    self.assertIsNone(xnmt.input.compression_type("examples/data/head.en"))
+    reader = xnmt.input.PlainTextReader(vocab=self.vocab, line_index=True, num_workers=2)
+    self.assertEqual(len(self.expected), reader.count_sents(filename))
+    self.assertEqual([self.expected[1], self.expected[4]], [sent.words for sent in reader.read_sents(filename, filter_ids=[4, 1])])
+    self.assertFalse(os.path.exists(filename + xnmt.input.LineIndex.INDEX_EXT))
+
+  def tearDown(self):
+    shutil.rmtree(self.out_dir)
+
+class TestBackgroundIterator(unittest.TestCase):
+
+  def test_iterate(self):
+    self.assertEqual(list(range(100)), list(BackgroundIterator(iter(range(100)), max_queued=3)))
+
+  def test_exception(self):
+    def failing():
+      yield 1
+      raise ValueError("producer failed")
+    items = BackgroundIterator(failing())
+    self.assertEqual(1, next(items))
+    with self.assertRaises(ValueError):
+      next(items)
+
+  def test_close(self):
+    items = BackgroundIterator(iter(range(1000)), max_queued=2)
+    self.assertEqual(0, next(items))
+    items.close()
+    items._thread.join(5)
+    self.assertFalse(items._thread.is_alive())
+
+class TestBackgroundTask(unittest.TestCase):
+
+  def test_result(self):
+    started = threading.Event()
+    proceed = threading.Event()
+    def task(x):
+      started.set()
+      proceed.wait(5)
+      return x * 2
+    background_task = BackgroundTask(task, 21)
+    started.wait(5)
+    self.assertFalse(background_task.done())
+    proceed.set()
+    self.assertEqual(42, background_task.result())
+    self.assertTrue(background_task.done())
+
+  def test_exception(self):
+    def failing():
+      raise ValueError("task failed")
+    with self.assertRaises(ValueError):
+      BackgroundTask(failing).result()
+
+class TestSegmentationTextReader(unittest.TestCase):
+
+  def setUp(self):
+    self.out_dir = tempfile.mkdtemp()
+
+  def tearDown(self):
+    shutil.rmtree(self.out_dir)
+
+  def test_lazy_read(self):
+    reader = xnmt.input.SegmentationTextReader()
+    sents = reader.read_sents(["examples/data/head-char.ja", "examples/data/head-seg.ja"])
+    self.assertFalse(isinstance(sents, list))
+    sents = list(sents)
+    self.assertEqual(reader.count_sents("['examples/data/head-char.ja', 'examples/data/head-seg.ja']"), len(sents))
+    with open("examples/data/head-seg.ja") as f:
+      seg_lines = f.readlines()
+    for sent, seg_line in zip(sents, seg_lines):
+      self.assertEqual(np.int32, sent.annotation["segment"].dtype)
+      self.assertEqual([int(x) for x in seg_line.split()], sent.annotation["segment"].tolist())
+
+  def test_filtered(self):
+    filename = ["examples/data/head-char.ja", "examples/data/head-seg.ja"]
+    reader = xnmt.input.SegmentationTextReader(line_index=True, line_index_dir=self.out_dir)
+    all_sents = list(reader.read_sents(filename))
+    filtered_sents = list(reader.read_sents(filename, filter_ids=[6, 2]))
+    self.assertEqual([all_sents[2].words, all_sents[6].words], [sent.words for sent in filtered_sents])
+    self.assertEqual(all_sents[6].annotation["segment"].tolist(), filtered_sents[1].annotation["segment"].tolist())
+
+  def test_single_file(self):
+    sents = list(xnmt.input.SegmentationTextReader().read_sents("examples/data/head-char.ja"))
+    self.assertEqual(10, len(sents))
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,35 @@
+import unittest
+
+import xnmt.batcher
+import xnmt.input
+from xnmt.loss_tracker import BatchLossTracker, BatchShapeStats
+from xnmt.vocab import Vocab
+
+class TestBatchShapeStats(unittest.TestCase):
+
+  def setUp(self):
+    src_sents = [xnmt.input.CompactSentenceInput([3] * i + [Vocab.ES]) for i in (1, 3, 2)]
+    trg_sents = [xnmt.input.CompactSentenceInput([4] * i + [Vocab.ES]) for i in (2, 2, 2)]
+    self.src = xnmt.batcher.pad_batch(src_sents)
+    self.trg = xnmt.batcher.pad_batch(trg_sents)
+
+  def test_tokens(self):
+    stats = BatchShapeStats()
+    stats.add_batch(self.src, self.trg)
+    stats.add_batch(self.src, self.trg)
+    self.assertEqual(24, stats.padded_tokens("src"))
+    self.assertEqual(18, stats.total_real_tokens("src"))
+    self.assertEqual(18, stats.padded_tokens("trg"))
+    self.assertEqual(18, stats.total_real_tokens("trg"))
+    self.assertAlmostEqual(0.25, stats.padding_ratio("src"))
+    self.assertEqual(0.0, stats.padding_ratio("trg"))
+    self.assertEqual(12, stats.padded_tokens("src", first_batch=1))
+    self.assertEqual(4, len(stats.report(first_batch=1, elapsed_time=1.0)))
+
+  def test_count_trg_words(self):
+    tracker = BatchLossTracker(0, 3)
+    self.assertEqual(6, tracker.count_trg_words(self.trg))
+    self.assertEqual(6, tracker.count_trg_words([sent.words.tolist() for sent in self.trg]))
+
+if __name__ == '__main__':
+  unittest.main()
@@ -47,6 +47,9 @@ class TestRunningConfig(unittest.TestCase):
   def test_reload(self):
     run.main(["test/config/reload.yaml"])
 
+  def test_augmentation(self):
+    run.main(["test/config/augmentation.yaml"])
+
   def test_reload_exc(self):
     with self.assertRaises(ValueError) as context:
       run.main(["test/config/reload_exception.yaml"])
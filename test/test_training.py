@@ -1,4 +1,5 @@
 import unittest
+import os, sys, shutil, tempfile
 
 import dynet as dy
 import numpy as np
@@ -17,7 +18,7 @@ from xnmt.vocab import Vocab
 from xnmt.model_context import ModelContext, PersistentParamCollection
 from xnmt.training_strategy import TrainingStrategy
 import xnmt.events
-from xnmt.optimizer import AdamTrainer
+from xnmt.optimizer import AdamTrainer, SimpleSGDTrainer
 
 class TestTruncatedBatchTraining(unittest.TestCase):
 
@@ -260,5 +261,140 @@ class TestOverfitting(unittest.TestCase):
                            training_regimen.logger.epoch_loss.loss_values['loss'] / training_regimen.logger.epoch_words,
                            places=2)
 
+class TestGradientAccumulation(unittest.TestCase):
+
+  def setUp(self):
+    xnmt.events.clear()
+
+  def test_overfitting_accumulated(self):
+    self.model_context = ModelContext()
+    self.model_context.dynet_param_collection = PersistentParamCollection("some_file", 1)
+    self.model_context.default_layer_dim = 16
+    train_args = {}
+    training_corpus = BilingualTrainingCorpus(train_src = "examples/data/head.ja",
+                                                            train_trg = "examples/data/head.en",
+                                                            dev_src = "examples/data/head.ja",
+                                                            dev_trg = "examples/data/head.en")
+    train_args['corpus_parser'] = BilingualCorpusParser(training_corpus = training_corpus,
+                                                        src_reader = PlainTextReader(),
+                                                        trg_reader = PlainTextReader())
+    train_args['training_strategy'] = TrainingStrategy()
+    train_args['model'] = DefaultTranslator(src_embedder=SimpleWordEmbedder(self.model_context, vocab_size=100),
+                                            encoder=BiLSTMSeqTransducer(self.model_context),
+                                            attender=MlpAttender(self.model_context),
+                                            trg_embedder=SimpleWordEmbedder(self.model_context, vocab_size=100),
+                                            decoder=MlpSoftmaxDecoder(self.model_context, vocab_size=100),
+                                            )
+    train_args['model_file'] = None
+    train_args['save_num_checkpoints'] = 0
+    train_args['trainer'] = AdamTrainer(self.model_context, alpha=0.1)
+    train_args['batcher'] = SrcBatcher(batch_size=5, break_ties_randomly=False)
+    train_args['update_every'] = 2
+    training_regimen = xnmt.train.TrainingRegimen(yaml_context=self.model_context, **train_args)
+    training_regimen.model_context = self.model_context
+    for _ in range(50):
+      training_regimen.one_epoch(update_weights=True)
+    self.assertAlmostEqual(0.0,
+                           training_regimen.logger.epoch_loss.loss_values['loss'] / training_regimen.logger.epoch_words,
+                           places=2)
+
+  def test_same_as_large_batch(self):
+    # one epoch over the 10 training sents is a single update both with update_every=2 and batch size 5,
+    # and with batch size 10
+    initial_values, final_values = None, []
+    for batch_size, update_every in [(5, 2), (10, 1)]:
+      xnmt.events.clear()
+      model_context = ModelContext()
+      model_context.dynet_param_collection = PersistentParamCollection("some_file", 1)
+      model_context.default_layer_dim = 16
+      train_args = {}
+      training_corpus = BilingualTrainingCorpus(train_src = "examples/data/head.ja",
+                                                              train_trg = "examples/data/head.en",
+                                                              dev_src = "examples/data/head.ja",
+                                                              dev_trg = "examples/data/head.en")
+      train_args['corpus_parser'] = BilingualCorpusParser(training_corpus = training_corpus,
+                                                          src_reader = PlainTextReader(),
+                                                          trg_reader = PlainTextReader())
+      train_args['training_strategy'] = TrainingStrategy()
+      train_args['model'] = DefaultTranslator(src_embedder=SimpleWordEmbedder(model_context, vocab_size=100),
+                                              encoder=BiLSTMSeqTransducer(model_context),
+                                              attender=MlpAttender(model_context),
+                                              trg_embedder=SimpleWordEmbedder(model_context, vocab_size=100),
+                                              decoder=MlpSoftmaxDecoder(model_context, vocab_size=100),
+                                              )
+      train_args['model_file'] = None
+      train_args['save_num_checkpoints'] = 0
+      train_args['trainer'] = SimpleSGDTrainer(model_context, e0=0.1)
+      train_args['batcher'] = SrcBatcher(batch_size=batch_size, break_ties_randomly=False)
+      train_args['update_every'] = update_every
+      training_regimen = xnmt.train.TrainingRegimen(yaml_context=model_context, **train_args)
+      training_regimen.model_context = model_context
+      param_col = model_context.dynet_param_collection.param_col
+      params = list(param_col.parameters_list()) + list(param_col.lookup_parameters_list())
+      if initial_values is None:
+        initial_values = [param.as_array() for param in params]
+      else:
+        # start from the same initial values as the first model
+        for param, value in zip(params, initial_values):
+          if isinstance(param, dy.LookupParameters):
+            param.init_from_array(value)
+          else:
+            param.set_value(value)
+      training_regimen.one_epoch(update_weights=True)
+      final_values.append([param.as_array() for param in params])
+    for accumulated_value, large_batch_value in zip(*final_values):
+      self.assertTrue(np.allclose(accumulated_value, large_batch_value, atol=1e-5))
+
+class TestReloadData(unittest.TestCase):
+
+  def setUp(self):
+    xnmt.events.clear()
+    self.out_dir = tempfile.mkdtemp()
+
+  def tearDown(self):
+    shutil.rmtree(self.out_dir)
+
+  def test_reloaded_corpus_is_trained_on(self):
+    # the stub reload command writes the first 10 - 3 * epoch lines of the data as training corpus
+    train_src, train_trg = os.path.join(self.out_dir, "train.ja"), os.path.join(self.out_dir, "train.en")
+    reload_command = '"%s" -c "import sys; n = 10 - 3 * int(sys.argv[2]); ' \
+                     '[open(out_file, \'w\').writelines(open(in_file).readlines()[:n]) ' \
+                     'for in_file, out_file in ((\'examples/data/head.ja\', \'%s\'), (\'examples/data/head.en\', \'%s\'))]"' \
+                     % (sys.executable, train_src, train_trg)
+    self.model_context = ModelContext()
+    self.model_context.dynet_param_collection = PersistentParamCollection("some_file", 1)
+    self.model_context.default_layer_dim = 16
+    train_args = {}
+    training_corpus = BilingualTrainingCorpus(train_src = train_src,
+                                              train_trg = train_trg,
+                                              dev_src = "examples/data/head.ja",
+                                              dev_trg = "examples/data/head.en")
+    train_args['corpus_parser'] = BilingualCorpusParser(training_corpus = training_corpus,
+                                                        src_reader = PlainTextReader(),
+                                                        trg_reader = PlainTextReader(),
+                                                        max_num_dev_sents = 5,
+                                                        lazy_read = True)
+    train_args['training_strategy'] = TrainingStrategy()
+    train_args['model'] = DefaultTranslator(src_embedder=SimpleWordEmbedder(self.model_context, vocab_size=100),
+                                            encoder=BiLSTMSeqTransducer(self.model_context),
+                                            attender=MlpAttender(self.model_context),
+                                            trg_embedder=SimpleWordEmbedder(self.model_context, vocab_size=100),
+                                            decoder=MlpSoftmaxDecoder(self.model_context, vocab_size=100),
+                                            )
+    train_args['model_file'] = None
+    train_args['save_num_checkpoints'] = 0
+    train_args['batcher'] = SrcBatcher(batch_size=5, break_ties_randomly=False)
+    train_args['reload_command'] = reload_command
+    training_regimen = xnmt.train.TrainingRegimen(yaml_context=self.model_context, **train_args)
+    training_regimen.model_context = self.model_context
+    training_regimen.one_epoch(update_weights=True)
+    self.assertEqual(10, training_regimen.logger.sent_num)
+    training_regimen._reload_task.result()
+    training_regimen.one_epoch(update_weights=True)
+    self.assertEqual(7, len(training_regimen.corpus_parser.training_corpus.train_src_data))
+    self.assertEqual(7, sum(len(batch) for batch in training_regimen.train_src))
+    self.assertEqual(7, training_regimen.logger.sent_num)
+    training_regimen._reload_task.result()
+
 if __name__ == '__main__':
   unittest.main()
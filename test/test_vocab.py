@@ -0,0 +1,36 @@
+import unittest
+
+import numpy as np
+
+from xnmt.vocab import Vocab
+from xnmt.output import TextOutput
+
+class TestVocab(unittest.TestCase):
+
+  def setUp(self):
+    self.vocab = Vocab(vocab_file="examples/data/head.en.vocab")
+    self.vocab.freeze()
+    self.vocab.set_unk(Vocab.UNK_STR)
+
+  def test_convert_list(self):
+    words = [u"the", u"unknown-word-xyz", u"a"]
+    self.assertEqual([self.vocab.convert(w) for w in words] + [Vocab.ES], self.vocab.convert_list(words, append_es=True))
+    self.assertEqual(self.vocab.unk_token, self.vocab.convert_list(words)[1])
+
+  def test_convert_list_not_frozen(self):
+    vocab = Vocab()
+    self.assertEqual([2, 3, 2], vocab.convert_list([u"a", u"b", u"a"]))
+    self.assertEqual([Vocab.SS_STR, Vocab.ES_STR, u"a", u"b"], vocab.i2w)
+
+  def test_to_words(self):
+    ids = self.vocab.convert_array([u"the", u"a"], append_es=True)
+    self.assertEqual([u"the", u"a", Vocab.ES_STR], self.vocab.to_words(ids))
+    self.assertEqual([u"the", u"a"], self.vocab.to_words(ids, set([Vocab.SS, Vocab.ES])))
+
+  def test_text_output(self):
+    actions = self.vocab.convert_list([u"the", u"a"], append_es=True)
+    self.assertEqual([u"the", u"a"], TextOutput(actions, self.vocab).to_string())
+    self.assertEqual([str(a) for a in actions[:2]], TextOutput(actions).to_string())
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,218 @@
+from __future__ import division, generators
+
+import numpy as np
+
+from xnmt.serializer import Serializable
+from xnmt.vocab import Vocab
+import xnmt.batcher
+import xnmt.input
+
+class BatchTransform(object):
+  """
+  A template class for data augmentation that is applied to padded training batches on the fly, as an in-process
+  alternative to rewriting the training data with a reload_command.
+
+  Transforms never modify the batch they are given, because the same batches are reused in later epochs.
+  All randomness is drawn from the random state passed in, which the TrainingRegimen seeds per epoch.
+  """
+
+  def __call__(self, batch, rng):
+    """
+    :param batch: a padded Batch
+    :param rng: numpy RandomState
+    :returns: a new, transformed Batch
+    """
+    raise NotImplementedError("__call__ must be implemented in BatchTransform subclasses")
+
+class FeatureNoise(BatchTransform, Serializable):
+  """
+  Adds Gaussian noise to the (unpadded) frames of array inputs.
+  """
+  yaml_tag = u"!FeatureNoise"
+
+  def __init__(self, stddev=0.1):
+    """
+    :param stddev: standard deviation of the noise
+    """
+    self.stddev = stddev
+
+  def __call__(self, batch, rng):
+    np_arr, unmasked = array_batch(batch, require_features=True)
+    noise = rng.normal(0.0, self.stddev, np_arr.shape) * unmasked[:, np.newaxis, :]
+    return make_batch(batch, (np_arr + noise).astype(np_arr.dtype), unmasked)
+
+class FeatureMasking(BatchTransform, Serializable):
+  """
+  Zeroes out randomly placed feature bands and time spans of array inputs, independently for each sent.
+  """
+  yaml_tag = u"!FeatureMasking"
+
+  def __init__(self, num_feat_masks=1, max_feat_width=0, num_time_masks=1, max_time_width=0):
+    """
+    :param num_feat_masks: number of feature bands per sent
+    :param max_feat_width: maximum width of a feature band (0 to disable)
+    :param num_time_masks: number of time spans per sent
+    :param max_time_width: maximum width of a time span (0 to disable)
+    """
+    self.num_feat_masks = num_feat_masks
+    self.max_feat_width = max_feat_width
+    self.num_time_masks = num_time_masks
+    self.max_time_width = max_time_width
+
+  def __call__(self, batch, rng):
+    np_arr, unmasked = array_batch(batch, require_features=True)
+    batch_size, feat_dim, seq_len = np_arr.shape
+    keep = np.ones(np_arr.shape, dtype=bool)
+    if self.max_feat_width > 0 and self.num_feat_masks > 0:
+      bands = FeatureMasking.random_spans(rng, np.full(batch_size, feat_dim), self.num_feat_masks, self.max_feat_width, feat_dim)
+      keep &= ~bands[:, :, np.newaxis]
+    if self.max_time_width > 0 and self.num_time_masks > 0:
+      spans = FeatureMasking.random_spans(rng, unmasked.sum(axis=1), self.num_time_masks, self.max_time_width, seq_len)
+      keep &= ~spans[:, np.newaxis, :]
+    return make_batch(batch, np_arr * keep, unmasked)
+
+  @staticmethod
+  def random_spans(rng, lengths, num_spans, max_width, size):
+    """
+    :param rng: numpy RandomState
+    :param lengths: numpy array with the length of the dimension to mask for each sent
+    :param num_spans: number of spans per sent
+    :param max_width: maximum span width
+    :param size: size of the dimension in the batch
+    :returns: boolean array of dimensions batch_size x size that is True inside the spans
+    """
+    widths = np.minimum(rng.randint(0, max_width + 1, size=(len(lengths), num_spans)), lengths[:, np.newaxis])
+    starts = (rng.random_sample((len(lengths), num_spans)) * (lengths[:, np.newaxis] - widths + 1)).astype(int)
+    positions = np.arange(size)[np.newaxis, np.newaxis, :]
+    in_span = (positions >= starts[:, :, np.newaxis]) & (positions < (starts + widths)[:, :, np.newaxis])
+    return in_span.any(axis=1)
+
+class Truncation(BatchTransform, Serializable):
+  """
+  Truncates all sents to at most max_len timesteps. For word id inputs, truncated sents keep their final
+  end-of-sentence token.
+  """
+  yaml_tag = u"!Truncation"
+
+  def __init__(self, max_len):
+    """
+    :param max_len: maximum number of timesteps
+    """
+    self.max_len = max_len
+
+  def __call__(self, batch, rng):
+    np_arr, unmasked = array_batch(batch)
+    if np_arr.shape[-1] <= self.max_len:
+      return batch
+    truncated_arr = np_arr[..., :self.max_len].copy()
+    if truncated_arr.ndim == 2:
+      truncated_arr[unmasked.sum(axis=1) > self.max_len, self.max_len - 1] = Vocab.ES
+    return make_batch(batch, truncated_arr, unmasked[:, :self.max_len])
+
+class Subsampling(BatchTransform, Serializable):
+  """
+  Keeps only every factor-th frame of array inputs, starting at a random offset.
+  """
+  yaml_tag = u"!Subsampling"
+
+  def __init__(self, factor=2):
+    """
+    :param factor: subsampling factor
+    """
+    self.factor = factor
+
+  def __call__(self, batch, rng):
+    np_arr, unmasked = array_batch(batch, require_features=True)
+    max_offset = min(self.factor, unmasked.sum(axis=1).min())
+    offset = rng.randint(0, max_offset) if max_offset > 1 else 0
+    return make_batch(batch, np_arr[..., offset::self.factor], unmasked[:, offset::self.factor])
+
+class TokenNoise(BatchTransform, Serializable):
+  """
+  Replaces word ids by a replacement id (e.g. the id of <unk>) or by random word ids with a given probability.
+  Sentence start and end tokens are never replaced.
+  """
+  yaml_tag = u"!TokenNoise"
+
+  def __init__(self, prob=0.1, replacement_id=None, vocab_size=None):
+    """
+    :param prob: probability of replacing a word
+    :param replacement_id: id to replace words with
+    :param vocab_size: if replacement_id is not given, words are replaced by random ids below vocab_size
+    """
+    if replacement_id is None and vocab_size is None:
+      raise RuntimeError("TokenNoise requires either replacement_id or vocab_size")
+    self.prob = prob
+    self.replacement_id = replacement_id
+    self.vocab_size = vocab_size
+
+  def __call__(self, batch, rng):
+    np_arr, unmasked = array_batch(batch)
+    if np_arr.ndim != 2:
+      raise RuntimeError("TokenNoise can only be applied to word id inputs")
+    replace = unmasked & (np_arr != Vocab.SS) & (np_arr != Vocab.ES) & (rng.random_sample(np_arr.shape) < self.prob)
+    if self.replacement_id is not None:
+      replacements = self.replacement_id
+    else:
+      replacements = rng.randint(Vocab.ES + 1, self.vocab_size, size=np_arr.shape)
+    return make_batch(batch, np.where(replace, replacements, np_arr).astype(np_arr.dtype), unmasked)
+
+def array_batch(batch, require_features=False):
+  """
+  :param batch: a padded Batch
+  :param require_features: raise an error if the batch doesn't consist of array inputs
+  :returns: tuple of the batch data (batch_size x seq_len or batch_size x feat_dim x seq_len) and a boolean
+            array of dimensions batch_size x seq_len that is True for timesteps that are not padding
+  """
+  np_arr = xnmt.batcher.prepare_batch(batch).np_arr
+  if np_arr is None:
+    raise RuntimeError("data augmentation requires batches of word id or array inputs, got %s" % type(batch[0]))
+  if require_features and np_arr.ndim != 3:
+    raise RuntimeError("this transform can only be applied to array inputs")
+  if batch.mask is None:
+    unmasked = np.ones((np_arr.shape[0], np_arr.shape[-1]), dtype=bool)
+  else:
+    unmasked = batch.mask.np_arr == 0
+  return np_arr, unmasked
+
+def make_batch(batch, np_arr, unmasked):
+  """
+  :param batch: the original Batch
+  :param np_arr: transformed batch data
+  :param unmasked: boolean array that is True for timesteps that are not padding
+  :returns: new Batch whose items are views of np_arr, keeping the sent type and annotations of the original items.
+            The mask is built anew from unmasked, after dropping trailing timesteps that are padding in all sents,
+            so that transforms that change sent lengths never leave a mask or padding that is out of date.
+  """
+  seq_len = unmasked.any(axis=0).nonzero()[0].max() + 1 if unmasked.any() else 0
+  if seq_len < unmasked.shape[1]:
+    np_arr, unmasked = np_arr[..., :seq_len], unmasked[:, :seq_len]
+  mask = None if unmasked.all() else xnmt.batcher.Mask((~unmasked).astype(float))
+  if np_arr.ndim == 3:
+    items = [xnmt.input.ArrayInput(arr) for arr in np_arr]
+  else:
+    old_unmasked = np.ones((len(batch), len(batch[0])), dtype=bool) if batch.mask is None else batch.mask.np_arr == 0
+    lengths_changed = not np.array_equal(old_unmasked, unmasked)
+    items = []
+    for item, row in zip(batch, np_arr):
+      if isinstance(item, xnmt.input.CompactSentenceInput):
+        new_item = xnmt.input.CompactSentenceInput(row)
+      else:
+        new_item = item.__class__(row.tolist())
+        if isinstance(item, xnmt.input.SentenceInput) and item.annotation:
+          if lengths_changed:
+            raise RuntimeError("transforms that change sent lengths can't be applied to annotated sents")
+          new_item.annotation = item.annotation
+      items.append(new_item)
+  return xnmt.batcher.Batch(items, mask, np_arr)
+
+def apply_transforms(batch, transforms, rng):
+  """
+  :param batch: a padded Batch
+  :param transforms: list of BatchTransform objects, applied in order
+  :param rng: numpy RandomState
+  :returns: transformed Batch
+  """
+  for transform in transforms:
+    batch = transform(batch, rng)
+  return batch
@@ -1,58 +1,120 @@
 from __future__ import division, generators
 
+import copy
+
 import six
 import random
 import numpy as np
 import dynet as dy
 from xnmt.vocab import Vocab
+import xnmt.input
 from xnmt.serializer import Serializable
 
 class Batch(list):
   """
   Specialization of list that indicates a (mini)batch of things, together with an optional mask.
   Should be treated as immutable object.
+
+  If the batch was created by padding compact sents or numpy array inputs, np_arr holds the padded data of
+  the whole batch (batch_size x seq_len word ids, or batch_size x feat_dim x seq_len features), and the batch
+  items are views of its rows. For other sents, prepare_batch() can create the word id matrix ahead of time.
   """
-  def __init__(self, batch_list, mask=None):
+  def __init__(self, batch_list, mask=None, np_arr=None):
     super(Batch, self).__init__(batch_list)
     self.mask = mask
+    self.np_arr = np_arr
 
 class Mask(object):
   """
   Masks are represented as numpy array of dimensions batchsize x seq_len, with parts
   belonging to the sequence set to 0, and parts that should be masked set to 1
+
+  Mask expressions are cached for the current computation graph, so that e.g. the per-timestep masks
+  used by the LSTM and the additive mask used by the attender are created only once per graph.
   """
   def __init__(self, np_arr):
     self.np_arr = np_arr
+    self._reversed = None
+    self._any_masked_col = None
+    self._all_masked_col = None
+    self._cg_version = None
+    self._expr_cache = {}
+
+  def prepare(self):
+    """
+    Precompute the per-timestep flags of this mask and of its reversed mask, e.g. in a background thread.
+    """
+    for mask in (self, self.reversed()):
+      mask.any_masked(0)
+      mask.all_masked(0)
 
   def reversed(self):
-    return Mask(self.np_arr[:,::-1])
+    if self._reversed is None:
+      self._reversed = Mask(self.np_arr[:,::-1])
+      self._reversed._reversed = self
+    return self._reversed
+
+  def any_masked(self, timestep=None):
+    """
+    :param timestep: index of a timestep, or None to check all timesteps
+    :returns: True if any sent in the batch is masked at the given timestep (or at any timestep)
+    """
+    if self._any_masked_col is None:
+      self._any_masked_col = np.any(self.np_arr, axis=0)
+    return self._any_masked_col.any() if timestep is None else self._any_masked_col[timestep]
+
+  def all_masked(self, timestep):
+    """
+    :param timestep: index of a timestep
+    :returns: True if all sents in the batch are masked at the given timestep
+    """
+    if self._all_masked_col is None:
+      self._all_masked_col = np.all(self.np_arr, axis=0)
+    return self._all_masked_col[timestep]
+
+  def cached_expr(self, key, create_fct):
+    """
+    :param key: hashable key identifying the expression
+    :param create_fct: function that creates the expression if it is not cached for the current graph
+    :returns: dynet expression
+    """
+    cg_version = dy.cg_version()
+    if cg_version != self._cg_version:
+      self._expr_cache = {}
+      self._cg_version = cg_version
+    expr = self._expr_cache.get(key)
+    if expr is None:
+      expr = self._expr_cache[key] = create_fct()
+    return expr
 
   def add_to_tensor_expr(self, tensor_expr, multiplicator=None):
-    # TODO: might cache these expressions to save memory
-    if np.count_nonzero(self.np_arr) == 0:
+    if not self.any_masked():
       return tensor_expr
     else:
       if multiplicator is not None:
-        mask_expr = dy.inputTensor(np.expand_dims(self.np_arr.transpose(), axis=1) * multiplicator, batched=True)
+        mask_expr = self.cached_expr(("add", multiplicator), lambda: dy.inputTensor(
+          np.expand_dims(self.np_arr.transpose(), axis=1) * multiplicator, batched=True))
       else:
-        mask_expr = dy.inputTensor(np.expand_dims(self.np_arr.transpose(), axis=1), batched=True)
+        mask_expr = self.cached_expr(("add", None), lambda: dy.inputTensor(
+          np.expand_dims(self.np_arr.transpose(), axis=1), batched=True))
       return tensor_expr + mask_expr
 
   def cmult_by_timestep_expr(self, expr, timestep, inverse=False):
-    # TODO: might cache these expressions to save memory
     """
     :param expr: a dynet expression corresponding to one timestep
     :param timestep: index of current timestep
     :param inverse: True will keep the unmasked parts, False will zero out the unmasked parts
     """
     if inverse:
-      if np.count_nonzero(self.np_arr[:,timestep:timestep+1]) == 0:
+      if not self.any_masked(timestep):
         return expr
-      mask_exp = dy.inputTensor((1.0 - self.np_arr)[:,timestep:timestep+1].transpose(), batched=True)
+      mask_exp = self.cached_expr(("keep", timestep), lambda: dy.inputTensor(
+        (1.0 - self.np_arr)[:,timestep:timestep+1].transpose(), batched=True))
     else:
-      if np.count_nonzero(self.np_arr[:,timestep:timestep+1]) == self.np_arr[:,timestep:timestep+1].size:
+      if self.all_masked(timestep):
         return expr
-      mask_exp = dy.inputTensor(self.np_arr[:,timestep:timestep+1].transpose(), batched=True)
+      mask_exp = self.cached_expr(("drop", timestep), lambda: dy.inputTensor(
+        self.np_arr[:,timestep:timestep+1].transpose(), batched=True))
     return dy.cmult(expr, mask_exp)
 
 class Batcher(object):
@@ -60,11 +122,22 @@ class Batcher(object):
   A template class to convert a list of sents to several batches of sents.
   """
 
-  def __init__(self, batch_size, granularity='sent', src_pad_token=Vocab.ES, trg_pad_token=Vocab.ES):
+  def __init__(self, batch_size, granularity='sent', src_pad_token=Vocab.ES, trg_pad_token=Vocab.ES,
+               max_sents=None):
+    """
+    :param batch_size: number of sents (granularity 'sent'), words (granularity 'word'), or source plus target
+                       tokens after padding (granularity 'padded_word') per batch
+    :param granularity: 'sent', 'word', or 'padded_word'
+    :param max_sents: maximum number of sents per batch for granularity 'padded_word'
+    """
     self.batch_size = batch_size
     self.src_pad_token = src_pad_token
     self.trg_pad_token = trg_pad_token
     self.granularity = granularity
+    self.max_sents = max_sents
+    # set when the same corpus is packed repeatedly (rebatch_every_epoch), to keep its lengths and sort keys cached
+    self.cache_corpus_data = False
+    self._length_cache = None
 
   def is_random(self):
     """
@@ -72,33 +145,86 @@ class Batcher(object):
     """
     return False
 
+  def sent_lengths(self, src, trg):
+    """
+    If cache_corpus_data is set, the lengths are cached for the most recently used corpus, so that packing the
+    same corpus again (e.g. once per epoch) doesn't need to look at every sent again.
+
+    :param src: list of source sents
+    :param trg: list of target sents
+    :returns: tuple of numpy arrays of source and target sent lengths
+    """
+    if not self.cache_corpus_data:
+      return sent_lengths(src), sent_lengths(trg)
+    length_cache = self._length_cache
+    if length_cache is None or length_cache[0] is not src or length_cache[1] is not trg:
+      length_cache = self._length_cache = (src, trg, sent_lengths(src), sent_lengths(trg))
+    return length_cache[2], length_cache[3]
+
+  def cached_data(self):
+    """
+    :returns: list of the objects in which data of the most recently packed corpus is cached
+    """
+    return [self._length_cache]
+
+  def copy_without_cache(self):
+    """
+    :returns: deep copy of this batcher that shares no state with it and doesn't include its cached data, e.g. for
+              packing a corpus in another thread
+    """
+    memo = {id(cache): None for cache in self.cached_data() if cache is not None}
+    return copy.deepcopy(self, memo)
+
   def add_single_batch(self, src_curr, trg_curr, src_ret, trg_ret):
-    src_id, src_mask = pad(src_curr, pad_token=self.src_pad_token)
-    src_ret.append(Batch(src_id, src_mask))
-    trg_id, trg_mask = pad(trg_curr, pad_token=self.trg_pad_token)
-    trg_ret.append(Batch(trg_id, trg_mask))
+    src_ret.append(pad_batch(src_curr, pad_token=self.src_pad_token))
+    trg_ret.append(pad_batch(trg_curr, pad_token=self.trg_pad_token))
 
   def pack_by_order(self, src, trg, order):
-    src_ret, src_curr = [], []
-    trg_ret, trg_curr = [], []
+    src_ret, trg_ret = [], []
+    for batch_ids in self.split_order(src, trg, order):
+      self.add_single_batch([src[i] for i in batch_ids], [trg[i] for i in batch_ids], src_ret, trg_ret)
+    return src_ret, trg_ret
+
+  def split_order(self, src, trg, order):
+    """
+    :param src: list of source sents
+    :param trg: list of target sents
+    :param order: ids of the sents in the order in which they are to be batched
+    :returns: list of lists of sent ids, one per batch
+    """
+    batches, curr = [], []
     if self.granularity == 'sent':
       for x in six.moves.range(0, len(order), self.batch_size):
-        self.add_single_batch([src[y] for y in order[x:x+self.batch_size]], [trg[y] for y in order[x:x+self.batch_size]], src_ret, trg_ret)
+        batches.append(order[x:x+self.batch_size])
     elif self.granularity == 'word':
+      src_len, trg_len = self.sent_lengths(src, trg)
       my_size = 0
       for i in order:
-        my_size += len_or_zero(src[i]) + len_or_zero(trg[i])
-        if my_size > self.batch_size and len(src_curr)>0:
-          self.add_single_batch(src_curr, trg_curr, src_ret, trg_ret)
-          my_size = len(src[i]) + len(trg[i])
-          src_curr = []
-          trg_curr = []
-        src_curr.append(src[i])
-        trg_curr.append(trg[i])
-      self.add_single_batch(src_curr, trg_curr, src_ret, trg_ret)
+        my_size += src_len[i] + trg_len[i]
+        if my_size > self.batch_size and len(curr)>0:
+          batches.append(curr)
+          my_size = src_len[i] + trg_len[i]
+          curr = []
+        curr.append(i)
+      batches.append(curr)
+    elif self.granularity == 'padded_word':
+      src_lens, trg_lens = self.sent_lengths(src, trg)
+      max_src_len, max_trg_len = 0, 0
+      for i in order:
+        src_len, trg_len = src_lens[i], trg_lens[i]
+        new_max_src_len, new_max_trg_len = max(max_src_len, src_len), max(max_trg_len, trg_len)
+        if len(curr) > 0 and ((len(curr) + 1) * (new_max_src_len + new_max_trg_len) > self.batch_size
+                              or (self.max_sents is not None and len(curr) >= self.max_sents)):
+          batches.append(curr)
+          new_max_src_len, new_max_trg_len = src_len, trg_len
+          curr = []
+        max_src_len, max_trg_len = new_max_src_len, new_max_trg_len
+        curr.append(i)
+      if len(curr) > 0:
+        batches.append(curr)
     else:
       raise RuntimeError("Illegal granularity specification {}".format(self.granularity))
-    return src_ret, trg_ret
+    return batches
 
 class InOrderBatcher(Batcher, Serializable):
   yaml_tag = u"!InOrderBatcher"
@@ -138,9 +264,40 @@ class SortBatcher(Batcher):
                                       src_pad_token=src_pad_token, trg_pad_token=trg_pad_token)
     self.sort_key = sort_key
     self.break_ties_randomly = break_ties_randomly
+    self._sort_key_cache = None
+
+  def sort_keys(self, src, trg):
+    """
+    :returns: numpy array of the sort keys of all sent pairs, cached for the most recently used corpus
+    """
+    sort_key_cache = self._sort_key_cache
+    if sort_key_cache is None or sort_key_cache[0] is not src or sort_key_cache[1] is not trg:
+      sort_keys = np.fromiter((self.sort_key(x) for x in six.moves.zip(src,trg)), dtype=np.float64, count=len(src))
+      sort_key_cache = self._sort_key_cache = (src, trg, sort_keys)
+    return sort_key_cache[2]
+
+  def cached_data(self):
+    return super(SortBatcher, self).cached_data() + [self._sort_key_cache]
+
+  @staticmethod
+  def length_sort_key(sort_by_trg=False):
+    """
+    :param sort_by_trg: sort primarily by target length instead of source length
+    :returns: sort key for (src_sent, trg_sent) pairs that sorts by the length of one side and breaks ties by the
+              length of the other side
+    """
+    if sort_by_trg:
+      return lambda x: len(x[1])+1.0e-6*len(x[0])
+    return lambda x: len(x[0])+1.0e-6*len(x[1])
 
   def pack(self, src, trg):
-    if self.break_ties_randomly:
+    if self.cache_corpus_data:
+      sort_keys = self.sort_keys(src, trg)
+      if self.break_ties_randomly:
+        order = np.argsort(sort_keys + np.random.uniform(-SortBatcher.__tiebreaker_eps, SortBatcher.__tiebreaker_eps, len(sort_keys)))
+      else:
+        order = np.argsort(sort_keys)
+    elif self.break_ties_randomly:
       order = np.argsort([self.sort_key(x) + random.uniform(-SortBatcher.__tiebreaker_eps, SortBatcher.__tiebreaker_eps) for x in six.moves.zip(src,trg)])
     else:
       order = np.argsort([self.sort_key(x) for x in six.moves.zip(src,trg)])
@@ -149,6 +306,250 @@ class SortBatcher(Batcher):
   def is_random(self):
     return self.break_ties_randomly
 
+class PaddedWordBatcher(SortBatcher, Serializable):
+  """
+  A class to create batches sorted by sent length, where the number of source plus target tokens *after padding*
+  (batch size times maximum length on each side) is capped. Unlike granularity 'word', this bounds the actual
+  compute and memory cost of each batch, even when a batch contains a long outlier.
+  A single sent pair that exceeds the budget on its own is put into a batch of its own.
+  """
+  yaml_tag = u"!PaddedWordBatcher"
+
+  def __init__(self, padded_words_per_batch, max_sents_per_batch=None, sort_by_trg=False,
+               src_pad_token=Vocab.ES, trg_pad_token=Vocab.ES, break_ties_randomly=True):
+    """
+    :param padded_words_per_batch: maximum number of padded source plus target tokens per batch
+    :param max_sents_per_batch: optional maximum number of sents per batch
+    :param sort_by_trg: sort primarily by target length instead of source length
+    """
+    sort_key = SortBatcher.length_sort_key(sort_by_trg)
+    super(PaddedWordBatcher, self).__init__(padded_words_per_batch, sort_key=sort_key, granularity='padded_word',
+                                            src_pad_token=src_pad_token, trg_pad_token=trg_pad_token,
+                                            break_ties_randomly=break_ties_randomly)
+    self.max_sents = max_sents_per_batch
+
+class PoolSortBatcher(SortBatcher, Serializable):
+  """
+  A class to create batches from a stream of sent pairs with bounded memory.
+
+  Sent pairs are collected into a pool of pool_size pairs, the pool is sorted by length and cut into batches,
+  and the batches of each pool are emitted in random order. This gives nearly the padding efficiency of sorting
+  the whole corpus, while only one pool needs to be held in memory and batches are available as soon as the
+  first pool is full.
+  """
+  yaml_tag = u"!PoolSortBatcher"
+
+  def __init__(self, batch_size, pool_size=10000, granularity='sent', sort_by_trg=False,
+               src_pad_token=Vocab.ES, trg_pad_token=Vocab.ES, break_ties_randomly=True):
+    """
+    :param batch_size: number of sents (granularity 'sent'), words (granularity 'word'), or padded words
+                       (granularity 'padded_word') per batch
+    :param pool_size: number of sent pairs that are sorted together
+    :param granularity: 'sent', 'word', or 'padded_word'
+    :param sort_by_trg: sort primarily by target length instead of source length
+    """
+    sort_key = SortBatcher.length_sort_key(sort_by_trg)
+    super(PoolSortBatcher, self).__init__(batch_size, sort_key=sort_key, granularity=granularity,
+                                          src_pad_token=src_pad_token, trg_pad_token=trg_pad_token,
+                                          break_ties_randomly=break_ties_randomly)
+    self.pool_size = pool_size
+
+  def is_random(self):
+    return True
+
+  def pack(self, src, trg):
+    src_ret, trg_ret = [], []
+    for src_batch, trg_batch in self.pack_stream(six.moves.zip(src, trg)):
+      src_ret.append(src_batch)
+      trg_ret.append(trg_batch)
+    return src_ret, trg_ret
+
+  def pack_stream(self, sent_pairs):
+    """
+    :param sent_pairs: iterator over (src_sent, trg_sent) pairs
+    :returns: iterator over (src_batch, trg_batch) pairs
+    """
+    src_pool, trg_pool = [], []
+    for src_sent, trg_sent in sent_pairs:
+      src_pool.append(src_sent)
+      trg_pool.append(trg_sent)
+      if len(src_pool) >= self.pool_size:
+        for batch_pair in self.pack_pool(src_pool, trg_pool):
+          yield batch_pair
+        src_pool, trg_pool = [], []
+    if src_pool:
+      for batch_pair in self.pack_pool(src_pool, trg_pool):
+        yield batch_pair
+
+  def pack_pool(self, src_pool, trg_pool):
+    """
+    :returns: list of (src_batch, trg_batch) pairs created by sorting the pool, in random order
+    """
+    src_ret, trg_ret = super(PoolSortBatcher, self).pack(src_pool, trg_pool)
+    return [(src_ret[i], trg_ret[i]) for i in np.random.permutation(len(src_ret))]
+
+class MemoryBudgetBatcher(SortBatcher, Serializable):
+  """
+  A class to create batches sorted by sent length that are split whenever their estimated computation graph memory
+  exceeds a budget, e.g. the memory reserved through --dynet-mem, so that a single outlier batch can't exhaust
+  DyNet's fixed memory pool.
+
+  The estimate counts the floats of the forward and backward pass of an attentional LSTM encoder-decoder:
+  per source token, bidirectional LSTM states of all layers; per target token, decoder LSTM states, an attention
+  MLP hidden layer over all source positions, and the output softmax over the target vocab. It is multiplied by
+  safety_factor to account for overhead of the particular model.
+
+  The estimate is not calibrated on probe batches: DyNet's Python API doesn't report how much of its memory pool
+  a computation graph uses, so a probe batch could only tell whether it fits, not how far the formula is off.
+  Instead, safety_factor can be tuned by hand, e.g. by lowering it while the largest batches still fit.
+  """
+  yaml_tag = u"!MemoryBudgetBatcher"
+
+  def __init__(self, batch_size, memory_budget, layer_dim, trg_vocab_size=None, layers=1, granularity='sent',
+               sort_by_trg=False, safety_factor=1.5, verbose=False,
+               src_pad_token=Vocab.ES, trg_pad_token=Vocab.ES, break_ties_randomly=True):
+    """
+    :param batch_size: number of sents (granularity 'sent'), words (granularity 'word'), or padded words
+                       (granularity 'padded_word') per batch, before splitting
+    :param memory_budget: memory budget per batch in MB
+    :param layer_dim: hidden dimension of encoder and decoder
+    :param trg_vocab_size: size of the target vocab (set automatically by the TrainingRegimen)
+    :param layers: number of encoder and decoder layers
+    :param granularity: 'sent', 'word', or 'padded_word'
+    :param sort_by_trg: sort primarily by target length instead of source length
+    :param safety_factor: factor by which the estimate is multiplied
+    :param verbose: print the numbers of split batches and of sents exceeding the budget on their own after packing
+                    (they are always available as num_split_batches and num_oversized_sents)
+    """
+    sort_key = SortBatcher.length_sort_key(sort_by_trg)
+    super(MemoryBudgetBatcher, self).__init__(batch_size, sort_key=sort_key, granularity=granularity,
+                                              src_pad_token=src_pad_token, trg_pad_token=trg_pad_token,
+                                              break_ties_randomly=break_ties_randomly)
+    self.memory_budget = memory_budget
+    self.layer_dim = layer_dim
+    self.layers = layers
+    self.trg_vocab_size = trg_vocab_size or 0
+    self.safety_factor = safety_factor
+    self.verbose = verbose
+    self.num_split_batches = 0
+    self.num_oversized_sents = 0
+
+  def estimate_memory(self, batch_size, src_len, trg_len):
+    """
+    :param batch_size: number of sents
+    :param src_len: padded source length
+    :param trg_len: padded target length
+    :returns: estimated memory of forward and backward pass in MB
+    """
+    src_floats = src_len * self.layers * 2 * 6 * self.layer_dim
+    trg_floats = trg_len * (self.layers * 6 * self.layer_dim + src_len * self.layer_dim + 2 * self.trg_vocab_size)
+    return self.safety_factor * 2 * 4 * batch_size * (src_floats + trg_floats) / (1024 * 1024)
+
+  def pack(self, src, trg):
+    self.num_split_batches, self.num_oversized_sents = 0, 0
+    ret = super(MemoryBudgetBatcher, self).pack(src, trg)
+    if self.verbose and self.num_split_batches > 0:
+      print("MemoryBudgetBatcher: split %d batches exceeding the memory budget of %sMB" % (self.num_split_batches, self.memory_budget))
+    if self.verbose and self.num_oversized_sents > 0:
+      print("WARNING: %d sents exceed the memory budget of %sMB on their own" % (self.num_oversized_sents, self.memory_budget))
+    return ret
+
+  def split_order(self, src, trg, order):
+    src_lens, trg_lens = self.sent_lengths(src, trg)
+    batches = []
+    for batch_ids in super(MemoryBudgetBatcher, self).split_order(src, trg, order):
+      self.split_to_budget(np.asarray(batch_ids, dtype=np.int64), src_lens, trg_lens, batches)
+    return batches
+
+  def split_to_budget(self, batch_ids, src_lens, trg_lens, batches):
+    """
+    Halve a batch recursively until the estimated memory of each part is within the budget.
+
+    :param batch_ids: numpy array of sent ids of the batch
+    :param src_lens: numpy array of the source lengths of all sents
+    :param trg_lens: numpy array of the target lengths of all sents
+    :param batches: list to which the resulting lists of sent ids are appended
+    """
+    if len(batch_ids) > 0 and self.estimate_memory(len(batch_ids), src_lens[batch_ids].max(), trg_lens[batch_ids].max()) > self.memory_budget:
+      if len(batch_ids) > 1:
+        self.num_split_batches += 1
+        half = len(batch_ids) // 2
+        self.split_to_budget(batch_ids[:half], src_lens, trg_lens, batches)
+        self.split_to_budget(batch_ids[half:], src_lens, trg_lens, batches)
+        return
+      self.num_oversized_sents += 1
+    batches.append(batch_ids)
+
+class BucketBatcher(Batcher, Serializable):
+  """
+  A class to create batches within buckets of sents with similar source and target length.
+
+  Each sent pair is assigned to a bucket according to the bucket boundaries of its source length and its
+  target length. Inside a bucket, sent pairs are sorted by length (breaking ties randomly), and batches are
+  formed so that no batch spans two buckets. The batch order is then shuffled across buckets.
+  After packing, padding_ratio holds the fraction of padded tokens on the source and on the target side.
+  """
+  yaml_tag = u"!BucketBatcher"
+
+  def __init__(self, batch_size, granularity='sent', src_boundaries=None, trg_boundaries=None, num_buckets=4,
+               src_pad_token=Vocab.ES, trg_pad_token=Vocab.ES):
+    """
+    :param batch_size: number of sents (granularity 'sent') or words (granularity 'word') per batch
+    :param granularity: 'sent' or 'word'
+    :param src_boundaries: increasing list of source lengths; a sent of length l falls into the first bucket
+                           with l <= boundary, or into the last bucket if l exceeds all boundaries.
+                           If not given, boundaries are derived from the quantiles of the source lengths.
+    :param trg_boundaries: same for the target side
+    :param num_buckets: number of buckets per side when deriving boundaries automatically
+    """
+    super(BucketBatcher, self).__init__(batch_size, granularity=granularity,
+                                        src_pad_token=src_pad_token, trg_pad_token=trg_pad_token)
+    self.src_boundaries = src_boundaries
+    self.trg_boundaries = trg_boundaries
+    self.num_buckets = num_buckets
+    self.padding_ratio = None
+
+  def is_random(self):
+    return True
+
+  def bucket_boundaries(self, lengths, boundaries=None):
+    """
+    :param lengths: numpy array of sent lengths
+    :param boundaries: explicit boundaries, or None to derive them from the length quantiles
+    :returns: sorted numpy array of bucket boundaries
+    """
+    if boundaries is not None:
+      return np.asarray(sorted(boundaries))
+    quantiles = np.linspace(0.0, 100.0, self.num_buckets + 1)[1:-1]
+    return np.unique(np.ceil(np.percentile(lengths, quantiles))) if len(lengths) > 0 else np.zeros(0)
+
+  def bucket_ids(self, src, trg):
+    """
+    :returns: tuple of numpy arrays of bucket ids, source lengths and target lengths
+    """
+    src_len, trg_len = self.sent_lengths(src, trg)
+    src_boundaries = self.bucket_boundaries(src_len, self.src_boundaries)
+    trg_boundaries = self.bucket_boundaries(trg_len, self.trg_boundaries)
+    bucket_ids = np.searchsorted(src_boundaries, src_len) * (len(trg_boundaries) + 1) \
+                 + np.searchsorted(trg_boundaries, trg_len)
+    return bucket_ids, src_len, trg_len
+
+  def pack(self, src, trg):
+    bucket_ids, src_len, trg_len = self.bucket_ids(src, trg)
+    order = np.lexsort((np.random.random(len(src)), trg_len, src_len, bucket_ids))
+    bucket_starts = np.flatnonzero(np.diff(bucket_ids[order])) + 1
+    src_ret, trg_ret = [], []
+    for bucket_order in np.split(order, bucket_starts):
+      if len(bucket_order) > 0:
+        bucket_src, bucket_trg = self.pack_by_order(src, trg, bucket_order)
+        src_ret.extend(bucket_src)
+        trg_ret.extend(bucket_trg)
+    batch_order = np.random.permutation(len(src_ret))
+    src_ret = [src_ret[i] for i in batch_order]
+    trg_ret = [trg_ret[i] for i in batch_order]
+    self.padding_ratio = (padding_ratio(src_ret), padding_ratio(trg_ret))
+    return src_ret, trg_ret
+
 # Module level functions
 def mark_as_batch(data, mask=None):
   if type(data) == Batch and mask is None:
@@ -161,16 +562,112 @@ def is_batched(data):
   return type(data) == Batch
 
 def pad(batch, pad_token=Vocab.ES):
-  max_len = max(len_or_zero(item) for item in batch)
-  min_len = min(len_or_zero(item) for item in batch)
-  if min_len == max_len:
-    return batch, None
-  masks = np.zeros([len(batch), max_len])
-  for i, v in enumerate(batch):
-    for j in range(len_or_zero(v), max_len):
-      masks[i,j] = 1.0
-  padded_items = [item.get_padded_sent(pad_token, max_len - len(item)) for item in batch]
-  return padded_items, Mask(masks)
+  """
+  :param batch: list of sents
+  :param pad_token: token to pad word id sents with (array inputs are padded with zeros)
+  :returns: tuple of padded sents and Mask, where the Mask is None if all sents have the same length
+  """
+  padded_batch = pad_batch(batch, pad_token)
+  return padded_batch, padded_batch.mask
+
+def pad_batch(batch, pad_token=Vocab.ES):
+  """
+  Pad a list of sents to the same length and create a Batch with the corresponding Mask.
+
+  The mask is computed from the array of sent lengths in one go. Word id sents (compact or list-backed) are copied
+  into a single padded int32 id matrix and 2-dimensional array inputs into a single padded feature tensor, which are
+  stored as Batch.np_arr; other sents are padded one by one.
+
+  :param batch: list of sents
+  :param pad_token: token to pad word id sents with (array inputs are padded with zeros)
+  :returns: Batch
+  """
+  lengths = sent_lengths(batch)
+  max_len = lengths.max()
+  unmasked = None
+  mask = None
+  if lengths.min() != max_len:
+    unmasked = np.arange(max_len)[np.newaxis,:] < lengths[:,np.newaxis]
+    mask = Mask((~unmasked).astype(float))
+  np_arr = None
+  if all(isinstance(item, xnmt.input.SimpleSentenceInput) for item in batch):
+    np_arr = word_id_matrix(batch, lengths, max_len, unmasked, pad_token)
+  if np_arr is not None:
+    padded_rows = None
+    padded_items = []
+    for item, row, length in zip(batch, np_arr, lengths):
+      if isinstance(item, xnmt.input.CompactSentenceInput):
+        padded_items.append(xnmt.input.CompactSentenceInput(row))
+      elif length == max_len:
+        padded_items.append(item)
+      else:
+        if padded_rows is None: padded_rows = np_arr.tolist()
+        padded_items.append(item.with_words(padded_rows[len(padded_items)]))
+  elif all(isinstance(item, xnmt.input.ArrayInput) and item.nparr.ndim == 2 for item in batch):
+    np_arr = np.zeros((len(batch), batch[0].nparr.shape[0], max_len),
+                      dtype=np.result_type(*[item.nparr.dtype for item in batch]))
+    for i, item in enumerate(batch):
+      np_arr[i, :, :lengths[i]] = item.nparr
+    padded_items = [xnmt.input.ArrayInput(arr) for arr in np_arr]
+  elif mask is None:
+    padded_items = batch
+  else:
+    padded_items = [item.get_padded_sent(pad_token, max_len - len(item)) for item in batch]
+  return Batch(padded_items, mask, np_arr)
+
+def word_id_matrix(batch, lengths, max_len, unmasked, pad_token):
+  """
+  :param batch: list of word id sents
+  :param lengths: numpy array of sent lengths
+  :param max_len: maximum sent length
+  :param unmasked: boolean matrix that is True for timesteps that are not padding, or None if there is no padding
+  :param pad_token: padding token
+  :returns: batch_size x max_len int32 matrix of the padded word ids, or None if the sents don't consist of int ids
+  """
+  word_arrs = [np.asarray(item.words) for item in batch]
+  if any(arr.size > 0 and (arr.ndim != 1 or arr.dtype.kind not in "iu") for arr in word_arrs):
+    return None
+  words = np.concatenate(word_arrs).astype(np.int32)
+  np_arr = np.full((len(batch), max_len), pad_token, dtype=np.int32)
+  if unmasked is None:
+    np_arr[:] = words.reshape(np_arr.shape)
+  else:
+    np_arr[unmasked] = words
+  return np_arr
+
+def padding_ratio(batches):
+  """
+  :param batches: list of padded Batch objects
+  :returns: fraction of padded tokens among all tokens of the batches
+  """
+  total_tokens, padded_tokens = 0, 0
+  for batch in batches:
+    if batch.mask is None:
+      total_tokens += len(batch) * len_or_zero(batch[0])
+    else:
+      total_tokens += batch.mask.np_arr.size
+      padded_tokens += np.count_nonzero(batch.mask.np_arr)
+  return padded_tokens / total_tokens if total_tokens > 0 else 0.0
+
+def prepare_batch(batch):
+  """
+  Do the numpy work for a batch ahead of graph construction: precompute the mask flags.
+
+  :param batch: a padded Batch
+  :returns: the same Batch
+  """
+  if not is_batched(batch):
+    return batch
+  if batch.mask is not None:
+    batch.mask.prepare()
+  return batch
+
+def sent_lengths(sents):
+  """
+  :param sents: list of sents
+  :returns: numpy array of sent lengths
+  """
+  return np.fromiter((len_or_zero(sent) for sent in sents), dtype=np.int64, count=len(sents))
 
 def len_or_zero(val):
   return len(val) if hasattr(val, '__len__') else 0
@@ -244,7 +741,7 @@ class WordSrcBatcher(WordSortBatcher, Serializable):
 
   def pack_by_order(self, src, trg, order):
     if self.avg_batch_size:
-      self.batch_size = sum([len(s) for s in src]) / len(src) * self.avg_batch_size
+      self.batch_size = self.sent_lengths(src, trg)[0].mean() * self.avg_batch_size
     return super(WordSrcBatcher, self).pack_by_order(src, trg, order)
 
 class WordTrgBatcher(WordSortBatcher, Serializable):
@@ -258,7 +755,7 @@ class WordTrgBatcher(WordSortBatcher, Serializable):
 
   def pack_by_order(self, src, trg, order):
     if self.avg_batch_size:
-      self.batch_size = sum([len(s) for s in trg]) / len(trg) * self.avg_batch_size
+      self.batch_size = self.sent_lengths(src, trg)[1].mean() * self.avg_batch_size
     return super(WordTrgBatcher, self).pack_by_order(src, trg, order)
 
 class WordSrcTrgBatcher(WordSortBatcher, Serializable):
@@ -272,7 +769,7 @@ class WordSrcTrgBatcher(WordSortBatcher, Serializable):
 
   def pack_by_order(self, src, trg, order):
     if self.avg_batch_size:
-      self.batch_size = sum([len(s) for s in src]) / len(src) * self.avg_batch_size
+      self.batch_size = self.sent_lengths(src, trg)[0].mean() * self.avg_batch_size
     return super(WordSrcTrgBatcher, self).pack_by_order(src, trg, order)
 
 class WordTrgSrcBatcher(WordSortBatcher, Serializable):
@@ -286,6 +783,6 @@ class WordTrgSrcBatcher(WordSortBatcher, Serializable):
 
   def pack_by_order(self, src, trg, order):
     if self.avg_batch_size:
-      self.batch_size = sum([len(s) for s in trg]) / len(trg) * self.avg_batch_size
+      self.batch_size = self.sent_lengths(src, trg)[1].mean() * self.avg_batch_size
     return super(WordTrgSrcBatcher, self).pack_by_order(src, trg, order)
 
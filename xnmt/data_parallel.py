@@ -0,0 +1,151 @@
+from __future__ import division, print_function
+
+import os
+import sys
+import ctypes
+import traceback
+import multiprocessing
+
+import numpy as np
+import dynet as dy
+
+class DataParallelGroup(object):
+  """
+  A group of processes that train replicas of the same model on disjoint batches, and periodically synchronize by
+  averaging their parameters.
+
+  The calling process becomes rank 0 and forks the other ranks, which inherit the model and the packed training
+  batches. Parameter values are exchanged through a shared memory buffer with one row per rank; small messages
+  (training progress, learning rate, ...) are exchanged through pipes between rank 0 and each other rank.
+  """
+
+  def __init__(self, param_collection, num_processes, seed=None):
+    """
+    :param param_collection: dynet ParameterCollection holding all model parameters
+    :param num_processes: total number of processes, including the calling process
+    :param seed: base random seed; each rank seeds numpy and DyNet with seed + rank. If not given, the base seed is
+                 drawn from the numpy random state of the calling process.
+    """
+    self.num_processes = num_processes
+    self.seed = seed
+    self.rank = 0
+    self.params = list(param_collection.parameters_list())
+    self.lookup_params = list(param_collection.lookup_parameters_list())
+    self.shapes = [param.as_array().shape for param in self.params + self.lookup_params]
+    self.sizes = [int(np.prod(shape)) for shape in self.shapes]
+    shared = multiprocessing.RawArray(ctypes.c_float, num_processes * sum(self.sizes))
+    self.buffer = np.frombuffer(shared, dtype=np.float32).reshape(num_processes, sum(self.sizes))
+    self.connections = []
+    self.worker_pids = []
+
+  def start(self, worker_fct):
+    """
+    Fork the processes of rank 1 to num_processes-1, which run worker_fct() and then exit.
+
+    :param worker_fct: function that runs the training loop
+    """
+    base_seed = self.seed if self.seed is not None else np.random.randint(2**31 - self.num_processes)
+    for rank in range(1, self.num_processes):
+      parent_conn, child_conn = multiprocessing.Pipe()
+      pid = os.fork()
+      if pid == 0:
+        parent_conn.close()
+        for conn in self.connections:
+          conn.close()
+        self.rank = rank
+        self.connections = [child_conn]
+        self.worker_pids = []
+        DataParallelGroup.reseed(base_seed + rank)
+        exit_code = 0
+        try:
+          worker_fct()
+        except Exception:
+          traceback.print_exc()
+          exit_code = 1
+        finally:
+          sys.stdout.flush()
+          sys.stderr.flush()
+          os._exit(exit_code)
+      child_conn.close()
+      self.connections.append(parent_conn)
+      self.worker_pids.append(pid)
+    DataParallelGroup.reseed(base_seed)
+
+  @staticmethod
+  def reseed(seed):
+    np.random.seed(seed)
+    if hasattr(dy, "reset_random_seed"):
+      dy.reset_random_seed(seed)
+
+  def join(self, raise_on_failure=True):
+    """
+    Wait for all other ranks to finish (only called by rank 0).
+
+    :param raise_on_failure: if True, raise an error if a worker failed; otherwise only log the failure (used while
+                             another exception is propagating, which must not be replaced)
+    """
+    for conn in self.connections:
+      conn.close()
+    failed = []
+    for pid in self.worker_pids:
+      _, status = os.waitpid(pid, 0)
+      if status != 0:
+        failed.append(pid)
+    self.connections, self.worker_pids = [], []
+    if failed:
+      if raise_on_failure:
+        raise RuntimeError("data parallel worker processes %s failed" % failed)
+      print("data parallel worker processes %s failed" % failed, file=sys.stderr)
+
+  def write_params(self, row):
+    pos = 0
+    for param, size in zip(self.params + self.lookup_params, self.sizes):
+      self.buffer[row, pos:pos+size] = param.as_array().ravel()
+      pos += size
+
+  def load_params(self, values):
+    pos = 0
+    for i, (param, size) in enumerate(zip(self.params + self.lookup_params, self.sizes)):
+      value = values[pos:pos+size].reshape(self.shapes[i])
+      if i < len(self.params):
+        param.set_value(value)
+      else:
+        param.init_from_array(value)
+      pos += size
+
+  def gather(self):
+    """
+    Receive one message from every other rank (only called by rank 0). The other ranks have written
+    their parameters to the shared buffer before sending.
+
+    :returns: list of messages
+    """
+    return [conn.recv() for conn in self.connections]
+
+  def average_params(self):
+    """
+    Set the parameters of rank 0 to the average over all ranks (only called by rank 0, after gather()).
+    """
+    self.write_params(0)
+    self.load_params(self.buffer.mean(axis=0))
+
+  def broadcast(self, message):
+    """
+    Send the parameters of rank 0 together with a message to all other ranks (only called by rank 0).
+    """
+    self.write_params(0)
+    for conn in self.connections:
+      conn.send(message)
+
+  def exchange(self, message):
+    """
+    Send the parameters of this rank and a message to rank 0, then wait for the broadcast of rank 0 and load
+    its parameters (only called by ranks other than 0).
+
+    :returns: the message broadcast by rank 0
+    """
+    self.write_params(self.rank)
+    self.connections[0].send(message)
+    reply = self.connections[0].recv()
+    self.load_params(self.buffer[0])
+    return reply
@@ -171,7 +171,10 @@ class SimpleWordEmbedder(Embedder, Serializable):
       seq_len = len(sent[0])
       for single_sent in sent: assert len(single_sent)==seq_len
       for word_i in range(seq_len):
-        batch = xnmt.batcher.mark_as_batch([single_sent[word_i] for single_sent in sent])
+        if sent.np_arr is not None:
+          batch = xnmt.batcher.mark_as_batch(sent.np_arr[:,word_i].tolist())
+        else:
+          batch = xnmt.batcher.mark_as_batch([single_sent[word_i] for single_sent in sent])
         embeddings.append(self.embed(batch))
 
     return ExpressionSequence(expr_list=embeddings, mask=sent.mask if xnmt.batcher.is_batched(sent) else None)
@@ -151,6 +151,8 @@ class BLEUEvaluator(Evaluator):
     self.smooth = smooth
     self.reference_corpus = None
     self.candidate_corpus = None
+    self._cached_ref = None
+    self._cached_ref_ngrams = None
 
   def metric_name(self):
     return "BLEU%d score" % (self.ngram)
@@ -168,7 +170,8 @@ class BLEUEvaluator(Evaluator):
   def evaluate(self, ref, hyp):
     """
     :rtype: object
-    :param ref: list of reference sents ( a sent is a list of tokens )
+    :param ref: list of reference sents ( a sent is a list of tokens ). The reference n-gram counts are cached
+                when the same (unmodified) list object is passed again, e.g. for repeated dev evaluations.
     :param hyp: list of hypothesis sents ( a sent is a list of tokens )
     :return: Formatted string having BLEU Score with different intermediate results such as ngram ratio,
     sent length, brevity penalty
@@ -186,11 +189,12 @@ class BLEUEvaluator(Evaluator):
     # Brevity Penalty variables
     word_counter = Counter()
 
-    for ref_sent, can_sent in zip(self.reference_corpus, self.candidate_corpus):
+    reference_ngram_counts = self.reference_ngrams(self.reference_corpus)
+    for ref_sent, ref_ngram_count, can_sent in zip(self.reference_corpus, reference_ngram_counts, self.candidate_corpus):
       word_counter['reference'] += len(ref_sent)
       word_counter['candidate'] += len(can_sent)
 
-      clip_count_dict, full_count_dict = self.modified_precision(ref_sent, can_sent)
+      clip_count_dict, full_count_dict = self.modified_precision(ref_sent, can_sent, ref_ngram_count)
 
       for ngram_type in full_count_dict:
         if ngram_type in clip_count_dict:
@@ -266,17 +270,29 @@ class BLEUEvaluator(Evaluator):
 
     return ngram_count
 
-  def modified_precision(self, reference_sent, candidate_sent):
+  def reference_ngrams(self, ref):
+    """
+    :param ref: list of reference sents
+    :return: list of n-gram counts of each reference sent, cached for the last reference corpus
+    """
+    if ref is not self._cached_ref:
+      self._cached_ref_ngrams = [self.extract_ngrams(ref_sent) for ref_sent in ref]
+      self._cached_ref = ref
+    return self._cached_ref_ngrams
+
+  def modified_precision(self, reference_sent, candidate_sent, reference_ngram_count=None):
     """
     Computes counts useful in modified precision calculations
     :param reference_sent: iterable of tokens
     :param candidate_sent: iterable of tokens
+    :param reference_ngram_count: n-gram counts of reference_sent if already known
     :return: tuple of Counter objects
     """
 
     clipped_ngram_count = defaultdict(Counter)
 
-    reference_ngram_count = self.extract_ngrams(reference_sent)
+    if reference_ngram_count is None:
+      reference_ngram_count = self.extract_ngrams(reference_sent)
     candidate_ngram_count = self.extract_ngrams(candidate_sent)
 
     for ngram_type in candidate_ngram_count:
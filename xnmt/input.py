@@ -1,10 +1,18 @@
 import numpy as np
 import os
 import io
+import gzip
+import bz2
+import glob
 import six
 import ast
+import copy
+import hashlib
+import array
+import multiprocessing
 from collections import defaultdict
 from xnmt.serializer import Serializable
+from xnmt.prefetch import BackgroundIterator
 from xnmt.vocab import *
 ###### Classes representing single inputs
 
@@ -12,6 +20,8 @@ class Input(object):
   """
   A template class to represent all inputs.
   """
+  __slots__ = ()
+
   def __len__(self):
     raise NotImplementedError("__len__() must be implemented by Input subclasses")
 
@@ -25,6 +35,8 @@ class SimpleSentenceInput(Input):
   """
   A simple sent, represented as a list of tokens
   """
+  __slots__ = ("words",)
+
   def __init__(self, words):
     self.words = words
 
@@ -39,28 +51,81 @@ class SimpleSentenceInput(Input):
       return self
     new_words = list(self.words)
     new_words.extend([token] * pad_len)
-    return self.__class__(new_words)
+    return self.with_words(new_words)
+
+  def with_words(self, words):
+    """
+    :param words: new list of words
+    :returns: a sent of the same type with the given words (and, for annotated sents, the same annotation)
+    """
+    return self.__class__(words)
 
   def __str__(self):
     return " ".join(six.moves.map(str, self.words))
 
+class CompactSentenceInput(SimpleSentenceInput):
+  """
+  A sent represented as a 1D int32 numpy array of word ids, which may be a view into a larger array
+  (e.g. a memory-mapped corpus or the padded id matrix of a whole batch).
+
+  Needs 4 bytes per word instead of a Python int per word. Single words are returned as Python ints.
+  """
+  __slots__ = ()
+
+  def __init__(self, words):
+    """
+    :param words: int32 numpy array, or any sequence of ints (which will be copied into a new array)
+    """
+    if not isinstance(words, np.ndarray) or words.dtype != np.int32:
+      words = np.asarray(words, dtype=np.int32)
+    self.words = words
+
+  def __getitem__(self, key):
+    if isinstance(key, slice):
+      return self.words[key]
+    return int(self.words[key])
+
+  def get_padded_sent(self, token, pad_len):
+    if pad_len == 0:
+      return self
+    words = np.full(len(self) + pad_len, token, dtype=np.int32)
+    words[:len(self)] = self.words
+    return CompactSentenceInput(words)
+
 class SentenceInput(SimpleSentenceInput):
+  """
+  A sent represented as a list of tokens, together with an annotation dict that is allocated on first access
+  """
+  __slots__ = ("_annotation",)
+
   def __init__(self, words):
     super(SentenceInput, self).__init__(words)
-    self.annotation = {}
+    self._annotation = None
+
+  @property
+  def annotation(self):
+    if self._annotation is None:
+      self._annotation = {}
+    return self._annotation
+
+  @annotation.setter
+  def annotation(self, value):
+    self._annotation = value
 
   def annotate(self, key, value):
     self.annotation[key] = value
 
-  def get_padded_sent(self, token, pad_len):
-    sent = super(SentenceInput, self).get_padded_sent(token, pad_len)
-    sent.annotation = self.annotation
+  def with_words(self, words):
+    sent = super(SentenceInput, self).with_words(words)
+    sent._annotation = self._annotation
     return sent
 
 class ArrayInput(Input):
   """
   A sent based on a single numpy array; first dimension contains tokens
   """
+  __slots__ = ("nparr",)
+
   def __init__(self, nparr):
     self.nparr = nparr
 
@@ -100,13 +165,237 @@ class InputReader(object):
   def freeze(self):
     pass
 
+# Compressed text files are recognized by their extension or, failing that, by their magic bytes
+_COMPRESSION_EXTENSIONS = {".gz": "gz", ".bz2": "bz2", ".xz": "xz"}
+
+def compression_type(filename):
+  """
+  :param filename: file to check
+  :returns: "gz", "bz2" or "xz" if the file is compressed, None otherwise
+  """
+  ext = os.path.splitext(filename)[1].lower()
+  if ext in _COMPRESSION_EXTENSIONS:
+    return _COMPRESSION_EXTENSIONS[ext]
+  with io.open(filename, "rb") as f:
+    head = f.read(10)
+  if head[:2] == b"\x1f\x8b":
+    return "gz"
+  if head[:6] == b"\xfd7zXZ\x00":
+    return "xz"
+  if head[:3] == b"BZh" and head[3:4] in b"123456789" and head[4:10] == b"\x31\x41\x59\x26\x53\x59":
+    return "bz2"
+  return None
+
+def _open_compressed(filename, compression):
+  if compression == "gz":
+    return gzip.open(filename, "rb")
+  elif compression == "bz2":
+    return bz2.BZ2File(filename, "rb")
+  elif compression == "xz":
+    try:
+      import lzma
+    except ImportError:
+      raise RuntimeError("reading xz-compressed file %s requires the lzma module" % filename)
+    return lzma.open(filename, "rb")
+  raise RuntimeError("unknown compression type %s" % compression)
+
+def _read_compressed_line_blocks(filename, compression, encoding, block_size=2**20):
+  f = _open_compressed(filename, compression)
+  try:
+    while True:
+      lines = f.readlines(block_size)
+      if not lines: break
+      yield [line.decode(encoding) for line in lines]
+  finally:
+    f.close()
+
+def iterate_text_lines(filename, encoding='utf-8', max_queued_blocks=16):
+  """
+  Iterate over the lines of a text file that may be gzip, bz2 or xz compressed.
+
+  Compressed files are decompressed and decoded by a background thread, which hands over blocks of lines
+  through a bounded queue, so decompression overlaps with the processing of the lines.
+
+  :param filename: text file, optionally compressed
+  :param encoding: text encoding
+  :param max_queued_blocks: maximum number of blocks of lines (of about 1MB each) decompressed ahead of the consumer
+  :returns: iterator over lines as unicode strings including the trailing newline
+  """
+  compression = compression_type(filename)
+  if compression is None:
+    with io.open(filename, encoding=encoding) as f:
+      for line in f:
+        yield line
+    return
+  blocks = BackgroundIterator(_read_compressed_line_blocks(filename, compression, encoding), max_queued=max_queued_blocks)
+  try:
+    for lines in blocks:
+      for line in lines:
+        yield line
+  finally:
+    blocks.close()
+
+class LineIndex(object):
+  """
+  Byte offsets of the lines of a text file, allowing to count lines in constant time and to
+  seek straight to given lines.
+
+  The index is stored next to the text file as <filename>.lineidx.npz, or in a given index directory, and rebuilt
+  whenever size or modification time of the text file have changed. If the index file can't be written (e.g. because
+  the directory is read-only), the index is only kept in memory.
+  """
+  INDEX_EXT = ".lineidx.npz"
+  _loaded = {}
+
+  def __init__(self, filename, offsets):
+    """
+    :param filename: indexed text file
+    :param offsets: start offset of every line, plus the file size as last element
+    """
+    self.filename = filename
+    self.offsets = offsets
+
+  @staticmethod
+  def for_file(filename, index_dir=None):
+    """
+    :param filename: text file
+    :param index_dir: directory to store the index file in; if not given, it is stored next to the text file
+    :returns: up-to-date LineIndex for the given file, loaded or built as needed
+    """
+    stat = os.stat(filename)
+    cached = LineIndex._loaded.get(filename, None)
+    if cached is not None and cached[0] == (stat.st_size, stat.st_mtime):
+      return cached[1]
+    index_file = LineIndex.index_file(filename, index_dir)
+    index = LineIndex._load(filename, index_file, stat)
+    if index is None:
+      index = LineIndex._build(filename)
+      LineIndex._save(index, index_file, stat)
+    LineIndex._loaded[filename] = ((stat.st_size, stat.st_mtime), index)
+    return index
+
+  @staticmethod
+  def index_file(filename, index_dir=None):
+    """
+    :param filename: text file
+    :param index_dir: directory to store the index file in, or None
+    :returns: name of the index file for the given text file
+    """
+    if index_dir is None:
+      return filename + LineIndex.INDEX_EXT
+    # the hash of the absolute path keeps index files of equally named text files in different directories apart
+    path_hash = hashlib.sha1(os.path.abspath(filename).encode('utf-8')).hexdigest()[:16]
+    return os.path.join(index_dir, "%s.%s%s" % (os.path.basename(filename), path_hash, LineIndex.INDEX_EXT))
+
+  @staticmethod
+  def _load(filename, index_file, stat):
+    if not os.path.isfile(index_file): return None
+    try:
+      with np.load(index_file) as saved:
+        if int(saved["size"]) != stat.st_size or float(saved["mtime"]) != stat.st_mtime:
+          return None
+        return LineIndex(filename, saved["offsets"])
+    except (IOError, OSError, ValueError, KeyError):
+      return None
+
+  @staticmethod
+  def _build(filename, chunk_size=2**24):
+    starts = [np.zeros(1, dtype=np.int64)]
+    pos = 0
+    with io.open(filename, "rb") as f:
+      while True:
+        chunk = f.read(chunk_size)
+        if not chunk: break
+        newlines = np.flatnonzero(np.frombuffer(chunk, dtype=np.uint8) == ord(b"\n"))
+        starts.append(newlines.astype(np.int64) + (pos + 1))
+        pos += len(chunk)
+    offsets = np.concatenate(starts)
+    if offsets[-1] != pos:
+      # last line is not terminated by a newline
+      offsets = np.append(offsets, pos)
+    return LineIndex(filename, offsets)
+
+  @staticmethod
+  def _save(index, index_file, stat):
+    tmp_file = "%s.%s.tmp" % (index_file, os.getpid())
+    try:
+      index_dir = os.path.dirname(index_file)
+      if index_dir and not os.path.isdir(index_dir):
+        os.makedirs(index_dir)
+      with io.open(tmp_file, "wb") as f:
+        np.savez(f, offsets=index.offsets, size=np.int64(stat.st_size), mtime=np.float64(stat.st_mtime))
+      os.rename(tmp_file, index_file)
+    except (IOError, OSError) as e:
+      print("Could not write line index %s, keeping it in memory only: %s" % (index_file, e))
+      try:
+        if os.path.exists(tmp_file): os.remove(tmp_file)
+      except (IOError, OSError):
+        pass
+
+  def __len__(self):
+    return len(self.offsets) - 1
+
+  def read_lines(self, line_ids):
+    """
+    :param line_ids: ids of lines to read (0-indexed); ids beyond the end of the file are ignored
+    :returns: iterator over the requested lines in file order, as unicode strings including the trailing newline
+    """
+    prev_id = None
+    with io.open(self.filename, "rb") as f:
+      for line_id in sorted(set(line_ids)):
+        if line_id >= len(self): break
+        if prev_id is None or line_id != prev_id + 1:
+          f.seek(self.offsets[line_id])
+        yield f.readline().decode('utf-8')
+        prev_id = line_id
+
 class BaseTextReader(InputReader):
+  """
+  Base class for readers of text files with one sentence per line.
+
+  Subclasses that set self.line_index to True count sentences and read filtered subsets
+  of sentences via a persistent LineIndex rather than scanning the file. The index files are stored
+  in self.line_index_dir if set, otherwise next to the data files.
+
+  Files compressed with gzip, bz2 or xz are decompressed on the fly (see iterate_text_lines()); they are
+  always scanned sequentially, as neither LineIndex nor parallel reading supports them.
+  """
+  def uses_line_index(self, filename):
+    return getattr(self, "line_index", False) and compression_type(filename) is None
+
   def count_sents(self, filename):
-    f = io.open(filename, encoding='utf-8')
-    try:
-      return sum(1 for _ in f)
-    finally:
-      f.close()
+    if self.uses_line_index(filename):
+      return len(LineIndex.for_file(filename, getattr(self, "line_index_dir", None)))
+    return sum(1 for _ in iterate_text_lines(filename))
+
+  def get_line_index(self, filename):
+    """
+    :returns: LineIndex for the given file; persistent if self.line_index is set, otherwise only built in memory
+    """
+    if self.uses_line_index(filename):
+      return LineIndex.for_file(filename, getattr(self, "line_index_dir", None))
+    return LineIndex._build(filename)
+
+  def iterate_lines(self, filename):
+    """
+    :param filename: data file
+    :returns: iterator over the raw lines of the file, which read_sent() turns into sentences
+    """
+    return iterate_text_lines(filename)
+
+  def read_sent(self, line):
+    """
+    :param line: a raw line as returned by iterate_lines()
+    :returns: the sentence
+    """
+    raise RuntimeError("%s doesn't support converting single lines" % self.__class__.__name__)
+
+  def line_len(self, line):
+    """
+    :param line: a raw line as returned by iterate_lines()
+    :returns: length of the sentence read_sent() would return for the line, without converting it
+    """
+    return len(line.split()) + 1
 
   def iterate_filtered(self, filename, filter_ids=None):
     """
@@ -114,27 +403,50 @@ class BaseTextReader(InputReader):
     :param filter_ids:
     :returns: iterator over lines as strings (useful for subclasses to implement read_sents)
     """
+    if filter_ids is not None and self.uses_line_index(filename):
+      for line in LineIndex.for_file(filename, getattr(self, "line_index_dir", None)).read_lines(filter_ids):
+        yield line
+      return
     sent_count = 0
     max_id = None
     if filter_ids is not None:
       max_id = max(filter_ids)
       filter_ids = set(filter_ids)
-    with io.open(filename, encoding='utf-8') as f:
-      for line in f:
-        if filter_ids is None or sent_count in filter_ids:
-          yield line
-        sent_count += 1
-        if max_id is not None and sent_count > max_id:
-          break
+    for line in iterate_text_lines(filename):
+      if filter_ids is None or sent_count in filter_ids:
+        yield line
+      sent_count += 1
+      if max_id is not None and sent_count > max_id:
+        break
 
 class PlainTextReader(BaseTextReader, Serializable):
   """
   Handles the typical case of reading plain text files,
   with one sent per line.
+
+  With num_workers > 1, whole files are read by a pool of worker processes, each of which
+  tokenizes and converts a range of lines. If the vocab is not frozen yet, the workers first
+  collect the new words of their ranges, which are added to the vocab in file order, so the
+  resulting word ids are the same as when reading sequentially.
   """
   yaml_tag = u'!PlainTextReader'
-  def __init__(self, vocab=None):
+
+  # files are only read in parallel if each worker process gets at least this many bytes
+  PARALLEL_MIN_CHUNK_SIZE = 2**20
+
+  def __init__(self, vocab=None, line_index=False, num_workers=1, compact=False, line_index_dir=None):
+    """
+    :param vocab: Vocab to use; if not given, the vocab is created when reading the training corpus
+    :param line_index: if True, use a persistent LineIndex for counting sentences and reading subsets of sentences
+    :param line_index_dir: directory to store LineIndex files in (default: next to the data files)
+    :param num_workers: number of processes to use for reading whole files
+    :param compact: if True, produce CompactSentenceInput objects that store word ids in int32 arrays (not supported by SegmentationTextReader)
+    """
     self.vocab = vocab
+    self.line_index = line_index
+    self.line_index_dir = line_index_dir
+    self.num_workers = num_workers
+    self.compact = compact
     if vocab is not None:
       self.vocab.freeze()
       self.vocab.set_unk(Vocab.UNK_STR)
@@ -142,9 +454,71 @@ class PlainTextReader(BaseTextReader, Serializable):
   def read_sents(self, filename, filter_ids=None):
     if self.vocab is None:
       self.vocab = Vocab()
-    return six.moves.map(lambda l: SimpleSentenceInput([self.vocab.convert(word) for word in l.strip().split()] + \
-                                                      [self.vocab.convert(Vocab.ES_STR)]),
-               self.iterate_filtered(filename, filter_ids))
+    chunks = self.parallel_chunks(filename) if filter_ids is None else None
+    if chunks:
+      return self._read_sents_parallel(chunks)
+    return six.moves.map(self.read_sent, self.iterate_filtered(filename, filter_ids))
+
+  def read_sent(self, line):
+    if self.compact:
+      return CompactSentenceInput(self.vocab.convert_array(line.split(), append_es=True))
+    return SimpleSentenceInput(self.vocab.convert_list(line.split(), append_es=True))
+
+  def parallel_chunks(self, filename):
+    """
+    :param filename: text file
+    :returns: list of (filename, start, end) byte ranges of whole lines, one per task of the worker pool,
+              or None if the file is to be read sequentially
+    """
+    if self.num_workers <= 1 or compression_type(filename) is not None: return None
+    size = os.path.getsize(filename)
+    num_chunks = min(self.num_workers * 4, size // self.PARALLEL_MIN_CHUNK_SIZE)
+    if num_chunks < 2: return None
+    bounds = [0]
+    with io.open(filename, "rb") as f:
+      for chunk_i in range(1, num_chunks):
+        f.seek(max(size * chunk_i // num_chunks - 1, bounds[-1]))
+        f.readline()
+        if bounds[-1] < f.tell() < size:
+          bounds.append(f.tell())
+    bounds.append(size)
+    return [(filename, start, end) for start, end in zip(bounds[:-1], bounds[1:])]
+
+  def _extend_vocab_parallel(self, chunks):
+    pool = multiprocessing.Pool(self.num_workers, _init_text_worker, (self.vocab.w2i, None))
+    try:
+      for new_words in pool.imap(_collect_new_words, chunks):
+        for word in new_words:
+          self.vocab.convert(word)
+    finally:
+      pool.terminate()
+
+  def _map_chunks_parallel(self, worker_fct, chunks):
+    """
+    :returns: iterator over the results of worker_fct for the given chunks, in order, using a frozen copy of the
+              current vocab in the workers (which is completed first if the vocab is not frozen)
+    """
+    if not self.vocab.frozen:
+      self._extend_vocab_parallel(chunks)
+    unk = getattr(self.vocab, "unk_token", None) if self.vocab.frozen else None
+    pool = multiprocessing.Pool(self.num_workers, _init_text_worker, (self.vocab.w2i, unk))
+    try:
+      for result in pool.imap(worker_fct, chunks):
+        yield result
+    finally:
+      pool.terminate()
+
+  def _read_sents_parallel(self, chunks):
+    for ids, lengths in self._map_chunks_parallel(_convert_chunk, chunks):
+      if self.compact:
+        ids = np.frombuffer(ids, dtype=np.int32) if len(ids) > 0 else np.zeros(0, dtype=np.int32)
+      pos = 0
+      for length in lengths:
+        if self.compact:
+          yield CompactSentenceInput(ids[pos:pos+length])
+        else:
+          yield SimpleSentenceInput(ids[pos:pos+length].tolist())
+        pos += length
 
   def freeze(self):
     self.vocab.freeze()
@@ -155,40 +529,159 @@ class PlainTextReader(BaseTextReader, Serializable):
     return len(self.vocab)
 
 class SegmentationTextReader(PlainTextReader):
+  """
+  Reads a character file together with a segmentation file, each with one sent per line. The segmentation file
+  contains the (0-based) positions of segment ends, which are stored as int32 array in the annotation "segment".
+
+  The filename passed to read_sents() and count_sents() is a list of the two file names (or its string
+  representation); for a single file name, sents are read by a PlainTextReader instead.
+  """
   yaml_tag = u'!SegmentationTextReader'
 
   def read_sents(self, filename, filter_ids=None):
     if self.vocab is None:
       self.vocab = Vocab()
-    def convert(line, segmentation):
-      line = line.strip().split()
-      ret = SentenceInput(list(six.moves.map(self.vocab.convert, line)) + [self.vocab.convert(Vocab.ES_STR)])
-      ret.annotate("segment", list(six.moves.map(int, segmentation.strip().split())))
-      return ret
+    filenames = self.segmentation_files(filename)
+    if filenames is None:
+      print("Reading %s with a PlainTextReader instead..." % filename)
+      return super(SegmentationTextReader, self).read_sents(filename, filter_ids)
+    chunks = self.parallel_segmentation_chunks(filenames) if filter_ids is None else None
+    if chunks:
+      return self._read_sents_parallel_segmentation(chunks)
+    return self._read_sents_segmentation(filenames, filter_ids)
+
+  def _read_sents_segmentation(self, filenames, filter_ids):
+    char_lines = self.iterate_filtered(filenames[0], filter_ids)
+    seg_lines = self.iterate_filtered(filenames[1], filter_ids)
+    return six.moves.map(self.read_sent, six.moves.zip(char_lines, seg_lines))
+
+  def iterate_lines(self, filename):
+    filenames = self.segmentation_files(filename)
+    if filenames is None:
+      return super(SegmentationTextReader, self).iterate_lines(filename)
+    return six.moves.zip(iterate_text_lines(filenames[0]), iterate_text_lines(filenames[1]))
 
-    if type(filename) != list:
+  def read_sent(self, line):
+    """
+    :param line: tuple of character line and segmentation line, or a single line read by a PlainTextReader
+    """
+    if not isinstance(line, tuple):
+      return super(SegmentationTextReader, self).read_sent(line)
+    char_line, seg_line = line
+    sent = SentenceInput(self.vocab.convert_list(char_line.split(), append_es=True))
+    sent.annotate("segment", np.array([int(x) for x in seg_line.split()], dtype=np.int32))
+    return sent
+
+  def line_len(self, line):
+    return super(SegmentationTextReader, self).line_len(line[0] if isinstance(line, tuple) else line)
+
+  def _read_sents_parallel_segmentation(self, chunks):
+    for ids, lengths, segs, seg_lengths in self._map_chunks_parallel(_convert_segmentation_chunk, chunks):
+      segs = np.frombuffer(segs, dtype=np.int32) if len(segs) > 0 else np.zeros(0, dtype=np.int32)
+      pos, seg_pos = 0, 0
+      for length, seg_length in zip(lengths, seg_lengths):
+        sent = SentenceInput(ids[pos:pos+length].tolist())
+        sent.annotate("segment", segs[seg_pos:seg_pos+seg_length])
+        yield sent
+        pos += length
+        seg_pos += seg_length
+
+  @staticmethod
+  def segmentation_files(filename):
+    """
+    :param filename: list of character file and segmentation file, or its string representation
+    :returns: list of the two file names, or None if filename is a single file name
+    """
+    if isinstance(filename, (list, tuple)):
+      return list(filename)
+    if filename.strip().startswith("["):
       try:
-        filename = ast.literal_eval(filename)
-      except:
-        print("Reading %s with a PlainTextReader instead..." % filename)
-        return super(SegmentationTextReader, self).read_sents(filename)
+        return list(ast.literal_eval(filename))
+      except (ValueError, SyntaxError):
+        pass
+    return None
 
-    max_id = None
-    if filter_ids is not None:
-      max_id = max(filter_ids)
-      filter_ids = set(filter_ids)
-    data = []
-    with io.open(filename[0], encoding='utf-8') as char_inp,\
-         io.open(filename[1], encoding='utf-8') as seg_inp:
-      for sent_count, (char_line, seg_line) in enumerate(zip(char_inp, seg_inp)):
-        if filter_ids is None or sent_count in filter_ids:
-          data.append(convert(char_line, seg_line))
-        if max_id is not None and sent_count > max_id:
-          break
-    return data
+  def parallel_segmentation_chunks(self, filename):
+    """
+    :param filename: list of character file and segmentation file
+    :returns: list of (char_file, start, end, seg_file, seg_start, seg_end) byte ranges covering the same lines
+              of both files, one per task of the worker pool, or None if the files are to be read sequentially
+    """
+    if self.num_workers <= 1 or any(compression_type(f) is not None for f in filename): return None
+    num_chunks = min(self.num_workers * 4, os.path.getsize(filename[0]) // self.PARALLEL_MIN_CHUNK_SIZE)
+    if num_chunks < 2: return None
+    char_index, seg_index = self.get_line_index(filename[0]), self.get_line_index(filename[1])
+    num_sents = min(len(char_index), len(seg_index))
+    line_bounds = [num_sents * chunk_i // num_chunks for chunk_i in range(num_chunks + 1)]
+    return [(filename[0], int(char_index.offsets[start]), int(char_index.offsets[end]),
+             filename[1], int(seg_index.offsets[start]), int(seg_index.offsets[end]))
+            for start, end in zip(line_bounds[:-1], line_bounds[1:]) if end > start]
 
   def count_sents(self, filename):
-    return super(SegmentationTextReader, self).count_sents(filename[0])
+    filenames = self.segmentation_files(filename)
+    return super(SegmentationTextReader, self).count_sents(filename if filenames is None else filenames[0])
+
+# State of the worker processes used by PlainTextReader with num_workers > 1
+
+_worker_w2i = None
+_worker_unk = None
+
+def _init_text_worker(w2i, unk):
+  global _worker_w2i, _worker_unk
+  _worker_w2i = w2i
+  _worker_unk = unk
+
+def _read_byte_range(filename, start, end):
+  with io.open(filename, "rb") as f:
+    f.seek(start)
+    lines = f.read(end - start).split(b"\n")
+  if lines and not lines[-1]:
+    lines.pop()
+  return [line.decode('utf-8') for line in lines]
+
+def _collect_new_words(chunk):
+  """
+  :returns: words in the lines of the chunk that are not in the worker's vocab, in order of first occurrence
+  """
+  new_words = []
+  seen = set()
+  for line in _read_byte_range(*chunk[:3]):
+    for word in line.split():
+      if word not in _worker_w2i and word not in seen:
+        seen.add(word)
+        new_words.append(word)
+  return new_words
+
+def _convert_lines(lines):
+  w2i, unk = _worker_w2i, _worker_unk
+  end_id = w2i[Vocab.ES_STR]
+  ids = array.array('i')
+  lengths = array.array('i')
+  for line in lines:
+    words = line.split()
+    ids.extend([w2i[word] if unk is None else w2i.get(word, unk) for word in words])
+    ids.append(end_id)
+    lengths.append(len(words) + 1)
+  return ids, lengths
+
+def _convert_chunk(chunk):
+  """
+  :returns: tuple of word ids of all lines of the chunk (each terminated by </s>) and number of ids per line
+  """
+  return _convert_lines(_read_byte_range(*chunk))
+
+def _convert_segmentation_chunk(chunk):
+  """
+  :returns: tuple of word ids and number of ids per line, and segmentation indices and number of indices per line
+  """
+  ids, lengths = _convert_lines(_read_byte_range(*chunk[:3]))
+  segs = array.array('i')
+  seg_lengths = array.array('i')
+  for line in _read_byte_range(*chunk[3:]):
+    seg = [int(x) for x in line.split()]
+    segs.extend(seg)
+    seg_lengths.append(len(seg))
+  return ids, lengths, segs, seg_lengths
 
 class ContVecReader(InputReader, Serializable):
   """
@@ -240,11 +733,200 @@ class IDReader(BaseTextReader, Serializable):
   """
   yaml_tag = u"!IDReader"
 
+  def __init__(self, line_index=False, line_index_dir=None):
+    """
+    :param line_index: if True, use a persistent LineIndex for counting sentences and reading subsets of sentences
+    :param line_index_dir: directory to store LineIndex files in (default: next to the data files)
+    """
+    self.line_index = line_index
+    self.line_index_dir = line_index_dir
+
+  def read_sents(self, filename, filter_ids=None):
+    return map(self.read_sent, self.iterate_filtered(filename, filter_ids))
+
+  def read_sent(self, line):
+    return int(line.strip())
+
+class BinaryIdReader(InputReader, Serializable):
+  """
+  Reads a corpus of word ids that has been compiled into binary form via compile_binary_corpus().
+
+  A compiled corpus consists of two numpy files:
+  * <prefix>.ids.npy: all word ids of the corpus (including the final </s> of each sentence) as a flat int32 array
+  * <prefix>.lengths.npy: the number of ids of each sentence, as int32 array
+
+  The ids are memory-mapped, so no tokenization or vocab lookups are performed when reading, and several
+  processes reading the same corpus share the same pages. Sents are returned as CompactSentenceInput
+  objects that are views of the memory-mapped ids. The filename passed to read_sents() and
+  count_sents() is the prefix given when compiling the corpus.
+  """
+  yaml_tag = u'!BinaryIdReader'
+
+  def __init__(self, vocab):
+    """
+    :param vocab: the vocab the corpus was compiled with
+    """
+    self.vocab = vocab
+    self.vocab.freeze()
+    self.vocab.set_unk(Vocab.UNK_STR)
+
   def read_sents(self, filename, filter_ids=None):
-    return map(lambda l: int(l.strip()), self.iterate_filtered(filename, filter_ids))
+    ids, offsets = self.load_compiled(filename)
+    if filter_ids is None:
+      sent_ids = six.moves.range(len(offsets) - 1)
+    else:
+      sent_ids = sorted(set(filter_ids))
+    for i in sent_ids:
+      yield CompactSentenceInput(ids[offsets[i]:offsets[i+1]])
+
+  def count_sents(self, filename):
+    return len(np.load(filename + ".lengths.npy", mmap_mode="r"))
+
+  def vocab_size(self):
+    return len(self.vocab)
+
+  @staticmethod
+  def load_compiled(filename):
+    """
+    :param filename: prefix of the compiled corpus
+    :returns: tuple of memory-mapped id array and sentence offsets (of length number of sentences + 1)
+    """
+    ids = np.load(filename + ".ids.npy", mmap_mode="r")
+    return ids, _load_offsets(filename, len(ids))
+
+def compile_binary_corpus(text_file, out_prefix, vocab):
+  """
+  Converts a plain text corpus into the binary format read by BinaryIdReader.
+
+  :param text_file: plain text file, one sentence per line
+  :param out_prefix: <out_prefix>.ids.npy and <out_prefix>.lengths.npy will be written
+  :param vocab: Vocab to convert words with (will be frozen); BinaryIdReader must later use the same vocab
+  """
+  reader = PlainTextReader(vocab)
+  ids = array.array('i')
+  lengths = array.array('i')
+  for sent in reader.read_sents(text_file):
+    ids.extend(sent.words)
+    lengths.append(len(sent.words))
+  np.save(out_prefix + ".ids.npy", np.frombuffer(ids, dtype=np.int32) if len(ids) > 0 else np.zeros(0, dtype=np.int32))
+  np.save(out_prefix + ".lengths.npy", np.frombuffer(lengths, dtype=np.int32) if len(lengths) > 0 else np.zeros(0, dtype=np.int32))
+
+class MmapContVecReader(InputReader, Serializable):
+  """
+  Reads sequences of continuous-space vectors that have been compiled into a single feature matrix
+  via compile_feature_store().
+
+  A compiled feature store consists of two numpy files:
+  * <prefix>.feats.npy: the frames of all sequences, concatenated into one (num_frames x feat_dim) matrix
+  * <prefix>.lengths.npy: the number of frames of each sequence, as int32 array
+
+  The feature matrix is memory-mapped and each sequence is returned as a view of it, so reading a corpus
+  neither decompresses nor copies any data. Sequences are produced in the same layout as ContVecReader
+  produces them, i.e. as (feat_dim x num_frames) arrays; whether the original data needed transposing
+  is decided when compiling. The filename passed to read_sents() and count_sents() is the prefix given
+  when compiling.
+  """
+  yaml_tag = u"!MmapContVecReader"
+
+  def read_sents(self, filename, filter_ids=None):
+    feats, offsets = self.load_compiled(filename)
+    if filter_ids is None:
+      sent_ids = six.moves.range(len(offsets) - 1)
+    else:
+      sent_ids = sorted(set(filter_ids))
+    for i in sent_ids:
+      yield ArrayInput(feats[offsets[i]:offsets[i+1]].T)
+
+  def count_sents(self, filename):
+    return len(np.load(filename + ".lengths.npy", mmap_mode="r"))
+
+  @staticmethod
+  def load_compiled(filename):
+    """
+    :param filename: prefix of the compiled feature store
+    :returns: tuple of memory-mapped feature matrix and sequence offsets (of length number of sequences + 1)
+    """
+    feats = np.load(filename + ".feats.npy", mmap_mode="r")
+    return feats, _load_offsets(filename, len(feats))
+
+def compile_feature_store(npz_file, out_prefix, transpose=False, dtype="float32"):
+  """
+  Converts a ".npz" archive as read by ContVecReader into the format read by MmapContVecReader.
+
+  The archive is read twice, first only the array headers to determine the size of the output,
+  then the arrays themselves, which are copied one at a time into the memory-mapped output.
+
+  :param npz_file: ".npz" archive with one array per sequence, named XXX_0, XXX_1, etc.
+  :param out_prefix: <out_prefix>.feats.npy and <out_prefix>.lengths.npy will be written
+  :param transpose: same meaning as for ContVecReader: True if the arrays are stored as [word_ind,feat_ind]
+  :param dtype: data type of the feature matrix, float32 or float16
+  """
+  if np.dtype(dtype) not in (np.dtype(np.float32), np.dtype(np.float16)):
+    raise RuntimeError("unsupported feature store dtype %s, must be float32 or float16" % dtype)
+  npz = np.load(npz_file)
+  try:
+    keys = sorted(npz.files, key=lambda x: int(x.split('_')[-1]))
+    lengths = np.zeros(len(keys), dtype=np.int32)
+    feat_dim = None
+    for i, key in enumerate(keys):
+      with npz.zip.open(key + ".npy") as member:
+        if np.lib.format.read_magic(member) == (1, 0):
+          shape = np.lib.format.read_array_header_1_0(member)[0]
+        else:
+          shape = np.lib.format.read_array_header_2_0(member)[0]
+      if len(shape) != 2: raise RuntimeError("expected 2D arrays in %s, found shape %s for %s" % (npz_file, shape, key))
+      num_frames, dim = shape if transpose else shape[::-1]
+      if feat_dim is not None and dim != feat_dim: raise RuntimeError("inconsistent feature dimensions in %s: %s != %s" % (npz_file, dim, feat_dim))
+      feat_dim = dim
+      lengths[i] = num_frames
+    feats = np.lib.format.open_memmap(out_prefix + ".feats.npy", mode="w+", dtype=dtype, shape=(int(lengths.sum()), feat_dim or 0))
+    pos = 0
+    for key, num_frames in zip(keys, lengths):
+      arr = npz[key]
+      feats[pos:pos+num_frames] = arr if transpose else arr.T
+      pos += num_frames
+    feats.flush()
+    del feats
+  finally:
+    npz.close()
+  np.save(out_prefix + ".lengths.npy", lengths)
+
+def _load_offsets(filename, num_items):
+  """
+  Read <filename>.lengths.npy of a compiled corpus and turn it into offsets into the flat data array.
+  """
+  lengths = np.load(filename + ".lengths.npy")
+  offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+  np.cumsum(lengths, out=offsets[1:])
+  if offsets[-1] != num_items:
+    raise RuntimeError("Corrupt compiled corpus %s: lengths sum up to %s, but found %s items" % (filename, offsets[-1], num_items))
+  return offsets
 
 ###### CorpusParser
 
+def _has_fixed_vocab(reader):
+  """
+  :returns: False if the reader builds its vocab from the data it reads, True otherwise
+  """
+  if not hasattr(reader, "vocab"): return True
+  return reader.vocab is not None and reader.vocab.frozen
+
+def _state_copy(obj):
+  """
+  :returns: shallow copy of obj that doesn't share the serialization state of Serializable objects
+  """
+  obj_copy = copy.copy(obj)
+  for attr in ("serialize_params", "init_params"):
+    if isinstance(getattr(obj, attr, None), dict):
+      setattr(obj_copy, attr, dict(getattr(obj, attr)))
+  return obj_copy
+
+def _supports_line_sampling(reader):
+  """
+  :returns: True if single sentences can be converted from raw lines via reader.read_sent()
+  """
+  return isinstance(reader, BaseTextReader) and _has_fixed_vocab(reader)
+
 class CorpusParser(object):
   """A class that can read in corpora for training and testing"""
   
@@ -262,6 +944,12 @@ class CorpusParser(object):
     """Read in the training corpus"""
     raise RuntimeError("CorpusParsers must implement read_training_corpus to read in the training/dev corpora")
 
+  def is_streaming(self):
+    """
+    :returns: True if the training data is not held in memory but read through iterate_training_windows() in each epoch
+    """
+    return False
+
 
 class BilingualCorpusParser(CorpusParser, Serializable):
   """A class that reads in bilingual corpora, consists of two InputReaders"""
@@ -269,7 +957,7 @@ class BilingualCorpusParser(CorpusParser, Serializable):
   yaml_tag = u"!BilingualCorpusParser"
   def __init__(self, training_corpus, src_reader, trg_reader, max_src_len=None, max_trg_len=None,
                max_num_train_sents=None, max_num_dev_sents=None, sample_train_sents=None,
-               lazy_read=False):
+               lazy_read=False, stream_window=None, rotate_shards=False, sample_seed=None):
     """
     :param src_reader: InputReader for source side
     :param trg_reader: InputReader for target side
@@ -277,8 +965,17 @@ class BilingualCorpusParser(CorpusParser, Serializable):
     :param max_src_len: filter pairs longer than this on the target side
     :param max_num_train_sents: only read the first n training sentences
     :param max_num_dev_sents: only read the first n dev sentences
-    :param sample_train_sents: sample n sentences without replacement from the training corpus (should probably be used with a prespecified vocab)
+    :param sample_train_sents: sample n sentences without replacement from the training corpus (should probably be used with a prespecified vocab).
+                               With prespecified vocabs, the sample is drawn in a single pass over the corpus via reservoir sampling.
+    :param sample_seed: random seed for sample_train_sents, to draw the same sample in repeated runs
     :param lazy_read: if True we don't read the training corpus upon initialization (requires the input reader vocabs being prespecified)
+    :param stream_window: if set, the training corpus is never held in memory as a whole; instead it is read from disk
+                          again in each epoch, in windows of this many sentence pairs that are batched one at a time
+                          (requires the input reader vocabs being prespecified). train_src / train_trg may then be
+                          glob patterns matching several shard files, which are paired up in sorted order.
+                          Batchers that support streaming (such as PoolSortBatcher) consume the sentence pairs
+                          directly instead of going through windows.
+    :param rotate_shards: in streaming mode, read only one shard pair per epoch, cycling through the shards
     """
     self.training_corpus = training_corpus
     self.src_reader = src_reader
@@ -288,31 +985,76 @@ class BilingualCorpusParser(CorpusParser, Serializable):
     self.max_num_train_sents = max_num_train_sents
     self.max_num_dev_sents = max_num_dev_sents
     self.sample_train_sents = sample_train_sents
+    self.sample_seed = sample_seed
     self.train_src_len, self.train_trg_len = None, None
     self.dev_src_len, self.dev_trg_len = None, None
+    self.stream_window = stream_window
+    self.rotate_shards = rotate_shards
+    # sentence counts of streamed training files, keyed by file name and valid for the given file size and mtime
+    self._shard_counts = {}
     if max_num_train_sents is not None and sample_train_sents is not None: raise RuntimeError("max_num_train_sents and sample_train_sents are mutually exclusive!")
+    if sample_train_sents is not None and int(sample_train_sents) <= 0: raise RuntimeError("sample_train_sents must be a positive number of sentences, got %s" % sample_train_sents)
+    if self.is_streaming():
+      if sample_train_sents is not None: raise RuntimeError("sample_train_sents is not supported when streaming the training corpus!")
+      if int(stream_window) <= 0: raise RuntimeError("stream_window must be a positive number of sentences, got %s" % stream_window)
+      for reader in (src_reader, trg_reader):
+        if getattr(reader, "vocab", True) is None:
+          raise RuntimeError("streaming the training corpus requires prespecified vocabularies")
+    elif rotate_shards:
+      raise RuntimeError("rotate_shards requires stream_window to be set!")
     if not lazy_read:
       self._read_training_corpus(self.training_corpus)
 
+  def is_streaming(self):
+    return self.stream_window is not None
+
+  def reading_copy(self):
+    """
+    :returns: copy of this parser with its own copies of the readers, which can read the corpus (e.g. in a
+              background thread) without changing the state of this parser or its readers. The vocabs are shared
+              and must therefore be frozen already.
+    """
+    if not (_has_fixed_vocab(self.src_reader) and _has_fixed_vocab(self.trg_reader)):
+      raise RuntimeError("reading a corpus with a copy of the parser requires frozen vocabularies")
+    parser = _state_copy(self)
+    parser.src_reader = _state_copy(self.src_reader)
+    parser.trg_reader = _state_copy(self.trg_reader)
+    parser._shard_counts = dict(self._shard_counts)
+    return parser
+
   def _read_training_corpus(self, training_corpus):
+    if self.is_streaming():
+      # training data is read window by window through iterate_training_windows()
+      training_corpus.train_src_data = None
+      training_corpus.train_trg_data = None
+      self.src_reader.freeze()
+      self.trg_reader.freeze()
+      self._read_dev_corpus(training_corpus)
+      return
     training_corpus.train_src_data = []
     training_corpus.train_trg_data = []
-    if self.sample_train_sents:
+    filter_ids = None
+    single_pass_sample = self.sample_train_sents and _supports_line_sampling(self.src_reader) and _supports_line_sampling(self.trg_reader)
+    if single_pass_sample:
+      train_pairs = self._sample_training_pairs(training_corpus)
+    elif self.sample_train_sents:
+      # readers still building their vocab must only see the sampled sentences, so count first and read selectively
       self.train_src_len = self.src_reader.count_sents(training_corpus.train_src)
       self.train_trg_len = self.trg_reader.count_sents(training_corpus.train_trg)
       if self.train_src_len != self.train_trg_len: raise RuntimeError("training src sentences don't match trg sentences: %s != %s!" % (self.train_src_len, self.train_trg_len))
       self.sample_train_sents = int(self.sample_train_sents)
-      filter_ids = np.random.choice(self.train_src_len, self.sample_train_sents, replace=False)
+      rng = np.random.RandomState(self.sample_seed) if self.sample_seed is not None else np.random
+      filter_ids = rng.choice(self.train_src_len, self.sample_train_sents, replace=False)
     elif self.max_num_train_sents:
       self.train_src_len = self.src_reader.count_sents(training_corpus.train_src)
       self.train_trg_len = self.trg_reader.count_sents(training_corpus.train_trg)
       if self.train_src_len != self.train_trg_len: raise RuntimeError("training src sentences don't match trg sentences: %s != %s!" % (self.train_src_len, self.train_trg_len))
       filter_ids = list(range(min(self.max_num_train_sents, self.train_trg_len)))
-    else:
-      filter_ids = None
-    src_train_iterator = self.src_reader.read_sents(training_corpus.train_src, filter_ids)
-    trg_train_iterator = self.trg_reader.read_sents(training_corpus.train_trg, filter_ids)
-    for src_sent, trg_sent in six.moves.zip_longest(src_train_iterator, trg_train_iterator):
+    if not single_pass_sample:
+      src_train_iterator = self.src_reader.read_sents(training_corpus.train_src, filter_ids)
+      trg_train_iterator = self.trg_reader.read_sents(training_corpus.train_trg, filter_ids)
+      train_pairs = six.moves.zip_longest(src_train_iterator, trg_train_iterator)
+    for src_sent, trg_sent in train_pairs:
       if src_sent is None or trg_sent is None:
         raise RuntimeError("training src sentences don't match trg sentences: %s != %s!" % (self.train_src_len or self.src_reader.count_sents(training_corpus.train_src), self.train_trg_len or self.trg_reader.count_sents(training_corpus.train_trg)))
       src_len_ok = self.max_src_len is None or len(src_sent) <= self.max_src_len
@@ -324,6 +1066,48 @@ class BilingualCorpusParser(CorpusParser, Serializable):
     self.src_reader.freeze()
     self.trg_reader.freeze()
 
+    self._read_dev_corpus(training_corpus)
+
+  def _sample_training_pairs(self, training_corpus):
+    """
+    Draw sample_train_sents sentence pairs uniformly without replacement from the pairs that pass the length filter,
+    in a single pass over the raw lines of the corpus, using reservoir sampling (Li, 1994, Algorithm L).
+    Only the sampled lines are converted to sentences.
+
+    :returns: list of sampled (src_sent, trg_sent) tuples, in corpus order
+    """
+    k = int(self.sample_train_sents)
+    if k <= 0: raise RuntimeError("sample_train_sents must be a positive number of sentences, got %s" % self.sample_train_sents)
+    rng = np.random.RandomState(self.sample_seed) if self.sample_seed is not None else np.random
+    src_lines = self.src_reader.iterate_lines(training_corpus.train_src)
+    trg_lines = self.trg_reader.iterate_lines(training_corpus.train_trg)
+    reservoir = []
+    w = np.exp(np.log(rng.random_sample()) / k)
+    next_i = k + int(np.floor(np.log(rng.random_sample()) / np.log(1.0 - w)))
+    num_sents = 0
+    num_filtered = 0
+    for src_line, trg_line in six.moves.zip_longest(src_lines, trg_lines):
+      if src_line is None or trg_line is None:
+        raise RuntimeError("training src sentences don't match trg sentences: %s != %s!" % (self.src_reader.count_sents(training_corpus.train_src), self.trg_reader.count_sents(training_corpus.train_trg)))
+      num_sents += 1
+      src_len_ok = self.max_src_len is None or self.src_reader.line_len(src_line) <= self.max_src_len
+      trg_len_ok = self.max_trg_len is None or self.trg_reader.line_len(trg_line) <= self.max_trg_len
+      if not (src_len_ok and trg_len_ok): continue
+      i = num_filtered
+      num_filtered += 1
+      if i < k:
+        reservoir.append((i, src_line, trg_line))
+      elif i == next_i:
+        reservoir[rng.randint(k)] = (i, src_line, trg_line)
+        w *= np.exp(np.log(rng.random_sample()) / k)
+        next_i += int(np.floor(np.log(rng.random_sample()) / np.log(1.0 - w))) + 1
+    if num_filtered < k:
+      raise RuntimeError("can't sample %s training sentences from a corpus of %s sentences (%s within the length limits)!" % (k, num_sents, num_filtered))
+    self.train_src_len = self.train_trg_len = num_sents
+    reservoir.sort(key=lambda x: x[0])
+    return [(self.src_reader.read_sent(src_line), self.trg_reader.read_sent(trg_line)) for _, src_line, trg_line in reservoir]
+
+  def _read_dev_corpus(self, training_corpus):
     training_corpus.dev_src_data = []
     training_corpus.dev_trg_data = []
     if self.max_num_dev_sents:
@@ -345,6 +1129,90 @@ class BilingualCorpusParser(CorpusParser, Serializable):
         training_corpus.dev_src_data.append(src_sent)
         training_corpus.dev_trg_data.append(trg_sent)
 
+  def train_shards(self, training_corpus, epoch_num=None):
+    """
+    :param training_corpus: the training corpus, whose train_src / train_trg may be glob patterns
+    :param epoch_num: if given and rotate_shards is set, return only the shard pair used in this (1-based) epoch
+    :returns: list of (src_file, trg_file) tuples
+    """
+    src_files = sorted(glob.glob(training_corpus.train_src)) or [training_corpus.train_src]
+    trg_files = sorted(glob.glob(training_corpus.train_trg)) or [training_corpus.train_trg]
+    if len(src_files) != len(trg_files):
+      raise RuntimeError("number of training src shards doesn't match trg shards: %s != %s!" % (len(src_files), len(trg_files)))
+    shards = list(zip(src_files, trg_files))
+    if self.rotate_shards and epoch_num is not None:
+      shards = [shards[(epoch_num - 1) % len(shards)]]
+    return shards
+
+  def count_train_sents(self, training_corpus, epoch_num=None):
+    """
+    Count the training sentences that will be streamed in the given epoch, before length filtering.
+    The count of each shard is cached as long as its size and modification time don't change.
+    """
+    num_sents = sum(self.count_shard_sents(src_file) for src_file, _ in self.train_shards(training_corpus, epoch_num))
+    if self.max_num_train_sents:
+      num_sents = min(num_sents, self.max_num_train_sents)
+    return num_sents
+
+  def count_shard_sents(self, src_file):
+    """
+    :param src_file: source side file of a training shard
+    :returns: number of sentences in the file
+    """
+    try:
+      stat = os.stat(src_file)
+    except (IOError, OSError):
+      # e.g. a pair of files for a SegmentationTextReader
+      return self.src_reader.count_sents(src_file)
+    cached = self._shard_counts.get(src_file)
+    if cached is None or cached[0] != (stat.st_size, stat.st_mtime):
+      cached = self._shard_counts[src_file] = ((stat.st_size, stat.st_mtime), self.src_reader.count_sents(src_file))
+    return cached[1]
+
+  def iterate_training_pairs(self, training_corpus, epoch_num=None):
+    """
+    Read the training corpus lazily, shard by shard.
+
+    :param training_corpus: the training corpus
+    :param epoch_num: (1-based) epoch number, used to select the shard if rotate_shards is set
+    :returns: iterator over length-filtered (src_sent, trg_sent) pairs
+    """
+    num_read = 0
+    for src_file, trg_file in self.train_shards(training_corpus, epoch_num):
+      if self.max_num_train_sents and num_read >= self.max_num_train_sents:
+        break
+      src_iterator = self.src_reader.read_sents(src_file)
+      trg_iterator = self.trg_reader.read_sents(trg_file)
+      for src_sent, trg_sent in six.moves.zip_longest(src_iterator, trg_iterator):
+        if src_sent is None or trg_sent is None:
+          raise RuntimeError("training src sentences don't match trg sentences: %s != %s!" % (self.src_reader.count_sents(src_file), self.trg_reader.count_sents(trg_file)))
+        if self.max_num_train_sents and num_read >= self.max_num_train_sents:
+          break
+        num_read += 1
+        src_len_ok = self.max_src_len is None or len(src_sent) <= self.max_src_len
+        trg_len_ok = self.max_trg_len is None or len(trg_sent) <= self.max_trg_len
+        if src_len_ok and trg_len_ok:
+          yield src_sent, trg_sent
+
+  def iterate_training_windows(self, training_corpus, epoch_num=None):
+    """
+    Read the training corpus lazily, shard by shard.
+
+    :param training_corpus: the training corpus
+    :param epoch_num: (1-based) epoch number, used to select the shard if rotate_shards is set
+    :returns: iterator over (src_sents, trg_sents) tuples of at most stream_window length-filtered sentence pairs
+    """
+    window_size = int(self.stream_window)
+    src_window, trg_window = [], []
+    for src_sent, trg_sent in self.iterate_training_pairs(training_corpus, epoch_num):
+      src_window.append(src_sent)
+      trg_window.append(trg_sent)
+      if len(src_window) >= window_size:
+        yield src_window, trg_window
+        src_window, trg_window = [], []
+    if src_window:
+      yield src_window, trg_window
+
 ###### Obsolete Functions
 
 # TODO: The following doesn't follow the current API. If it is necessary, it should be retooled
@@ -3,9 +3,98 @@ from __future__ import division, generators
 import sys
 import math
 import time
+import numpy as np
 import xnmt.loss
+import xnmt.batcher
 from xnmt.vocab import Vocab
 
+class BatchShapeStats(object):
+  """
+  Collects the shapes of training batches: number of sents, padded length, and number of real tokens
+  on the source and target side. Everything is derived from the batch masks, at the cost of a few
+  numpy operations per batch.
+  """
+
+  def __init__(self):
+    self.batch_sizes = []
+    self.max_lens = {"src": [], "trg": []}
+    self.real_tokens = {"src": [], "trg": []}
+
+  def add_batch(self, src, trg):
+    self.batch_sizes.append(len(src) if xnmt.batcher.is_batched(src) else 1)
+    for side, batch in (("src", src), ("trg", trg)):
+      max_len, real_tokens = BatchShapeStats.batch_shape(batch)
+      self.max_lens[side].append(max_len)
+      self.real_tokens[side].append(real_tokens)
+
+  @staticmethod
+  def batch_shape(batch):
+    """
+    :param batch: a padded Batch or a single sent
+    :returns: tuple of the padded length and the number of real (not masked) tokens
+    """
+    if not xnmt.batcher.is_batched(batch):
+      max_len = xnmt.batcher.len_or_zero(batch)
+      return max_len, max_len
+    if batch.mask is None:
+      max_len = xnmt.batcher.len_or_zero(batch[0])
+      return max_len, max_len * len(batch)
+    return batch.mask.np_arr.shape[1], batch.mask.np_arr.size - int(np.count_nonzero(batch.mask.np_arr))
+
+  def num_batches(self):
+    return len(self.batch_sizes)
+
+  def padded_tokens(self, side, first_batch=0):
+    """
+    :param side: "src" or "trg"
+    :param first_batch: only count batches starting with this index
+    :returns: number of tokens including padding
+    """
+    return int(np.dot(self.batch_sizes[first_batch:], self.max_lens[side][first_batch:])) \
+      if len(self.batch_sizes) > first_batch else 0
+
+  def total_real_tokens(self, side, first_batch=0):
+    """
+    :param side: "src" or "trg"
+    :param first_batch: only count batches starting with this index
+    :returns: number of tokens excluding padding
+    """
+    return sum(self.real_tokens[side][first_batch:])
+
+  def padding_ratio(self, side):
+    padded = self.padded_tokens(side)
+    return 1.0 - self.total_real_tokens(side) / padded if padded > 0 else 0.0
+
+  @staticmethod
+  def histogram(values, num_bins=5):
+    """
+    :returns: string representation of a histogram of the given integer values
+    """
+    values = np.asarray(values)
+    if len(values) == 0:
+      return ""
+    edges = np.unique(np.linspace(values.min(), values.max() + 1, num_bins + 1).astype(int))
+    counts, edges = np.histogram(values, bins=edges)
+    return " ".join("[%d-%d]:%d" % (edges[i], edges[i+1]-1, counts[i]) for i in range(len(counts)))
+
+  def report(self, first_batch=0, elapsed_time=None):
+    """
+    :param first_batch: compute throughput over batches starting with this index
+    :param elapsed_time: time spent on these batches, in seconds
+    :returns: list of report lines
+    """
+    lines = []
+    for side in ("src", "trg"):
+      padded, real = self.padded_tokens(side), self.total_real_tokens(side)
+      lines.append("- %s tokens: real=%d padded=%d padding=%.2f%%, max_len per batch: %s" % (
+        side, real, padded, 100.0 * self.padding_ratio(side), BatchShapeStats.histogram(self.max_lens[side])))
+    lines.append("- sents per batch: mean=%.1f, %s" % (np.mean(self.batch_sizes), BatchShapeStats.histogram(self.batch_sizes)))
+    if elapsed_time:
+      real = self.total_real_tokens("src", first_batch) + self.total_real_tokens("trg", first_batch)
+      padded = self.padded_tokens("src", first_batch) + self.padded_tokens("trg", first_batch)
+      lines.append("- tokens/sec: real=%.2f padded=%.2f" % (real / elapsed_time, padded / elapsed_time))
+    return lines
+
 class LossTracker(object):
   """
   A template class to track training process and generate report.
@@ -24,6 +113,8 @@ class LossTracker(object):
 
     self.epoch_loss = xnmt.loss.LossBuilder()
     self.epoch_words = 0
+    self.batch_stats = BatchShapeStats()
+    self.last_report_batches = 0
     self.sent_num = 0
     self.sent_num_not_report_train = 0
     self.sent_num_not_report_dev = 0
@@ -44,6 +135,8 @@ class LossTracker(object):
     """
     self.epoch_loss = xnmt.loss.LossBuilder()
     self.epoch_words = 0
+    self.batch_stats = BatchShapeStats()
+    self.last_report_batches = 0
     self.epoch_num += 1
     self.sent_num = 0
     self.sent_num_not_report_train = 0
@@ -61,6 +154,22 @@ class LossTracker(object):
     self.sent_num_not_report_dev += batch_sent_num
     self.epoch_words += self.count_trg_words(trg)
     self.epoch_loss += loss
+    self.batch_stats.add_batch(src, trg)
+
+  def add_progress(self, sent_num, words, loss_values):
+    """
+    Add training progress made elsewhere (e.g. by other data parallel processes) to the epoch-wise counters.
+
+    :param sent_num: number of sents
+    :param words: number of trg words
+    :param loss_values: dict of loss sums by loss name
+    """
+    self.sent_num += sent_num
+    self.sent_num_not_report_train += sent_num
+    self.sent_num_not_report_dev += sent_num
+    self.epoch_words += words
+    for loss_name, loss_value in loss_values.items():
+      self.epoch_loss.loss_values[loss_name] += loss_value
 
   def format_time(self, seconds):
     return "{}-{}".format(int(seconds) // 86400,
@@ -88,7 +197,11 @@ class LossTracker(object):
         for loss_name, loss_values in self.epoch_loss:
           print("- %s %5.6f" % (loss_name, loss_values / self.epoch_words))
 
+      for line in self.batch_stats.report(self.last_report_batches, this_report_time - self.last_report_train_time):
+        print(line)
+
       self.last_report_words = self.epoch_words
+      self.last_report_batches = self.batch_stats.num_batches()
       self.last_report_train_time = this_report_time
 
       return print_report
@@ -165,6 +278,8 @@ class BatchLossTracker(LossTracker):
   """
 
   def count_trg_words(self, trg_words):
+    if getattr(trg_words, "np_arr", None) is not None:
+      return int(np.count_nonzero(trg_words.np_arr != Vocab.ES))
     trg_cnt = 0
     for x in trg_words:
       if type(x) == int:
@@ -20,8 +20,9 @@ class TextOutput(Output):
     self.filtered_tokens = set([Vocab.SS, Vocab.ES])
 
   def to_string(self):
-    map_func = lambda wi: self.vocab[wi] if self.vocab != None else str
-    return six.moves.map(map_func, filter(lambda wi: wi not in self.filtered_tokens, self.actions))
+    if self.vocab is None:
+      return [str(wi) for wi in self.actions if wi not in self.filtered_tokens]
+    return self.vocab.to_words(self.actions, self.filtered_tokens)
 
 class OutputProcessor(object):
   def process_outputs(self, outputs):
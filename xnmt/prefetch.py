@@ -0,0 +1,113 @@
+import sys
+import threading
+
+import six
+
+class BackgroundIterator(object):
+  """
+  Iterates over the items of another iterable, which are produced by a background thread
+  and handed over through a bounded queue.
+
+  This lets producers that spend most of their time outside the Python interpreter (I/O,
+  decompression, ...) overlap with the consumer. Exceptions raised by the producer are
+  re-raised in the consumer. If the consumer stops early, close() should be called so that
+  the background thread terminates.
+  """
+  _END = object()
+
+  def __init__(self, iterable, max_queued=16):
+    """
+    :param iterable: iterable to consume in the background
+    :param max_queued: maximum number of items produced ahead of the consumer
+    """
+    self._queue = six.moves.queue.Queue(max_queued)
+    self._stopped = threading.Event()
+    self._done = False
+    self._thread = threading.Thread(target=self._produce, args=(iterable,))
+    self._thread.daemon = True
+    self._thread.start()
+
+  def _produce(self, iterable):
+    try:
+      for item in iterable:
+        if not self._put((item, None)):
+          break
+      else:
+        self._put((self._END, None))
+    except Exception:
+      self._put((self._END, sys.exc_info()))
+    finally:
+      if hasattr(iterable, "close"):
+        iterable.close()
+
+  def _put(self, entry):
+    while not self._stopped.is_set():
+      try:
+        self._queue.put(entry, timeout=0.1)
+        return True
+      except six.moves.queue.Full:
+        pass
+    return False
+
+  def __iter__(self):
+    return self
+
+  def __next__(self):
+    if self._done:
+      raise StopIteration
+    item, exc_info = self._queue.get()
+    if item is self._END:
+      self._done = True
+      if exc_info is not None:
+        six.reraise(*exc_info)
+      raise StopIteration
+    return item
+
+  next = __next__
+
+  def close(self):
+    """
+    Stop the background thread, discarding any items that have not been consumed yet.
+    """
+    self._done = True
+    self._stopped.set()
+
+class BackgroundTask(object):
+  """
+  Runs a function in a background thread, so that its result can be picked up later without blocking
+  once it is done. Exceptions raised by the function are re-raised by result().
+  """
+
+  def __init__(self, fct, *args, **kwargs):
+    """
+    :param fct: function to run
+    :param args: positional arguments for fct
+    :param kwargs: keyword arguments for fct
+    """
+    self._result, self._exc_info = None, None
+    self._thread = threading.Thread(target=self._run, args=(fct, args, kwargs))
+    self._thread.daemon = True
+    self._thread.start()
+
+  def _run(self, fct, args, kwargs):
+    try:
+      self._result = fct(*args, **kwargs)
+    except Exception:
+      self._exc_info = sys.exc_info()
+
+  def done(self):
+    """
+    :returns: True if the function has returned or raised an exception
+    """
+    return not self._thread.is_alive()
+
+  def result(self):
+    """
+    Wait for the function to finish.
+
+    :returns: return value of the function
+    """
+    self._thread.join()
+    if self._exc_info is not None:
+      six.reraise(*self._exc_info)
+    return self._result
@@ -2,6 +2,8 @@
 from __future__ import division, print_function
 
 import argparse
+import copy
+import math
 import sys
 import six
 from six.moves import range
@@ -28,7 +30,10 @@ from xnmt.retriever import *
 from xnmt.training_corpus import *
 from xnmt.loss_tracker import *
 from xnmt.segmenting_encoder import *
+import xnmt.augmentation
+from xnmt.data_parallel import DataParallelGroup
 from xnmt.loss import LossBuilder
+from xnmt.prefetch import BackgroundIterator, BackgroundTask
 from xnmt.model_context import ModelContext, PersistentParamCollection
 from xnmt.training_strategy import TrainingStrategy, TrainingMLELoss
 from xnmt.serializer import YamlSerializer, Serializable
@@ -48,7 +53,9 @@ class TrainingRegimen(Serializable):
                pretrained_model_file="", src_format="text",
                trainer=None, lr_decay=1.0, lr_decay_times=3, attempts_before_lr_decay=1,
                dev_metrics="", schedule_metric="loss", restart_trainer=False,
-               reload_command=None):
+               reload_command=None, inference_only=False, rebatch_every_epoch=False, prefetch_batches=0,
+               src_transforms=None, trg_transforms=None, transform_seed=None, update_every=1,
+               num_processes=1, sync_every=10):
     """
     :param corpus_parser:
     :param model_file:
@@ -70,6 +77,26 @@ class TrainingRegimen(Serializable):
     :param reload_command: Command to change the input data after each epoch.
                            --epoch EPOCH_NUM will be appended to the command.
                            To just reload the data after each epoch set the command to 'true'.
+    :param inference_only: only set up the corpus readers and the model, e.g. for decoding with a trained model.
+                           No training or dev data is read, which requires prespecified vocabs and a corpus parser
+                           with lazy_read set. Such a TrainingRegimen can't be trained.
+    :param rebatch_every_epoch: re-pack the training batches at the start of every epoch if the batcher is random,
+                                so that batch composition changes between epochs and not just the batch order
+    :param prefetch_batches: if > 0, prepare up to this many upcoming training batches (reading in streaming mode,
+                             packing, mask and id matrix creation) in a background thread while the current batch is
+                             computed
+    :param src_transforms: list of BatchTransform objects (see xnmt.augmentation) applied to each source training batch
+                           on the fly, e.g. for data augmentation without a reload_command
+    :param trg_transforms: list of BatchTransform objects applied to each target training batch
+    :param transform_seed: if set, the transforms of epoch n are seeded with transform_seed + n
+    :param update_every: accumulate the gradients of this many batches before each parameter update. As losses are
+                         summed over the sentences of a batch, an update then corresponds to one batch that is
+                         update_every times as large, while only one batch at a time needs to fit into memory.
+    :param num_processes: number of processes for data parallel training. Each process trains a replica of the model
+                          on its own share of the training batches, and the replicas are averaged every sync_every
+                          batches and at the end of each epoch. Training progress is reported, dev checkpoints are
+                          evaluated and the model is saved by the main process, at synchronization points only.
+    :param sync_every: number of batches each process trains on between parameter averaging
     """
     dy.renew_cg()
 
@@ -79,6 +106,9 @@ class TrainingRegimen(Serializable):
                pretrained_model_file=pretrained_model_file, src_format=src_format, default_layer_dim=glob.get("default_layer_dim", 512),
                trainer=trainer, lr_decay=lr_decay, lr_decay_times=lr_decay_times, attempts_before_lr_decay=attempts_before_lr_decay,
                dev_metrics=dev_metrics, schedule_metric=schedule_metric, restart_trainer=restart_trainer,reload_command=reload_command,
+               inference_only=inference_only, rebatch_every_epoch=rebatch_every_epoch, prefetch_batches=prefetch_batches,
+               src_transforms=src_transforms or [], trg_transforms=trg_transforms or [], transform_seed=transform_seed,
+               update_every=update_every, num_processes=num_processes, sync_every=sync_every,
                dropout=glob.get("dropout", 0.0), weight_noise=glob.get("weight_noise", 0.0), model=model)
     self.args = args
     if yaml_context:
@@ -90,9 +120,18 @@ class TrainingRegimen(Serializable):
 
     if args["lr_decay"] > 1.0 or args["lr_decay"] <= 0.0:
       raise RuntimeError("illegal lr_decay, must satisfy: 0.0 < lr_decay <= 1.0")
+    if args["update_every"] < 1:
+      raise RuntimeError("illegal update_every, must be a positive number of batches")
+    if args["num_processes"] > 1 and (args["reload_command"] is not None or args["rebatch_every_epoch"]):
+      raise RuntimeError("data parallel training requires fixed training batches and is not supported together "
+                         "with reload_command or rebatch_every_epoch")
+    self._data_parallel = None
     self.num_times_lr_decayed = 0
     self.early_stopping_reached = False
     self.cur_attempt = 0
+    self._num_accumulated_batches = 0
+    # dev data cached across checkpoints by _prepare_dev_references()
+    self._dev_src_corpus, self._dev_refs, self._dev_evaluators = None, None, {}
 
     self.evaluators = [s.lower() for s in self.args["dev_metrics"].split(",") if s.strip()!=""]
     if self.args["schedule_metric"].lower() not in self.evaluators:
@@ -101,6 +140,7 @@ class TrainingRegimen(Serializable):
 
     if args["reload_command"] is not None:
         self._augmentation_handle = None
+        self._reload_task = None
         self._augment_data_initial()
 
     # Initialize the serializer
@@ -110,12 +150,17 @@ class TrainingRegimen(Serializable):
 
     self.model.initialize_training_strategy(self.training_strategy)
 
+    if args["inference_only"]:
+      return
+
     if self.args["batcher"] is None:
       self.batcher = SrcBatcher(32)
     else:
       self.batcher = self.args["batcher"]
     if args["src_format"] == "contvec":
       self.batcher.pad_token = np.zeros(self.model.src_embedder.emb_dim)
+    if args["rebatch_every_epoch"]:
+      self.batcher.cache_corpus_data = True
     self.pack_batches()
     self.logger = BatchLossTracker(args["dev_every"], self.total_train_sent)
 
@@ -129,19 +174,34 @@ class TrainingRegimen(Serializable):
             DependentInitParam(param_descr="model.decoder.vocab_size", value_fct=lambda: initialized_subcomponents["corpus_parser"].trg_reader.vocab_size()),
             DependentInitParam(param_descr="model.trg_embedder.vocab_size", value_fct=lambda: initialized_subcomponents["corpus_parser"].trg_reader.vocab_size()),
             DependentInitParam(param_descr="model.src_embedder.vocab", value_fct=lambda: initialized_subcomponents["corpus_parser"].src_reader.vocab),
-            DependentInitParam(param_descr="model.trg_embedder.vocab", value_fct=lambda: initialized_subcomponents["corpus_parser"].trg_reader.vocab)]
+            DependentInitParam(param_descr="model.trg_embedder.vocab", value_fct=lambda: initialized_subcomponents["corpus_parser"].trg_reader.vocab),
+            DependentInitParam(param_descr="batcher.trg_vocab_size", value_fct=lambda: initialized_subcomponents["corpus_parser"].trg_reader.vocab_size())]
 
   def pack_batches(self):
-    self.train_src, self.train_trg = \
-      self.batcher.pack(self.corpus_parser.training_corpus.train_src_data, self.corpus_parser.training_corpus.train_trg_data)
+    self.pack_train_batches()
     self.dev_src, self.dev_trg = \
       self.batcher.pack(self.corpus_parser.training_corpus.dev_src_data, self.corpus_parser.training_corpus.dev_trg_data)
 
+  def pack_train_batches(self):
+    if self.corpus_parser.is_streaming():
+      # training batches are packed window by window in one_epoch()
+      self.train_src, self.train_trg = None, None
+    else:
+      self.train_src, self.train_trg = \
+        self.batcher.pack(self.corpus_parser.training_corpus.train_src_data, self.corpus_parser.training_corpus.train_trg_data)
+    self._train_batches_used = False
+
   def create_corpus_and_model(self):
     self.corpus_parser = self.args["corpus_parser"]
-    if not hasattr(self.corpus_parser.training_corpus, "train_src_data"): # TODO: not so pretty, needs refactoring
-      self.corpus_parser._read_training_corpus(self.corpus_parser.training_corpus)
-    self.total_train_sent = len(self.corpus_parser.training_corpus.train_src_data)
+    if self.args["inference_only"]:
+      self.total_train_sent = 0
+    else:
+      if not hasattr(self.corpus_parser.training_corpus, "train_src_data"): # TODO: not so pretty, needs refactoring
+        self.corpus_parser._read_training_corpus(self.corpus_parser.training_corpus)
+      if self.corpus_parser.is_streaming():
+        self.total_train_sent = self.corpus_parser.count_train_sents(self.corpus_parser.training_corpus, 1)
+      else:
+        self.total_train_sent = len(self.corpus_parser.training_corpus.train_src_data)
     self.model_context.default_layer_dim = self.args["default_layer_dim"]
     self.model_context.dropout = self.args["dropout"]
     self.model_context.weight_noise = self.args["weight_noise"]
@@ -164,27 +224,73 @@ class TrainingRegimen(Serializable):
       self._augmentation_handle.wait()
 
   def _augment_data_next_epoch(self):
-    augment_command = self.args["reload_command"]
-    if self._augmentation_handle is None:
-      # first run
-      self._augmentation_handle = Popen(augment_command + " --epoch %d" % self.logger.epoch_num, shell=True)
-      self._augmentation_handle.wait()
-   
-    self._augmentation_handle.poll()
-    retcode = self._augmentation_handle.returncode
-    if retcode is not None:
-      if self.logger.epoch_num > 0:
-        print('using reloaded data')
-      # reload the data   
-      self.corpus_parser._read_training_corpus(self.corpus_parser.training_corpus) # TODO: fix
-      self.pack_batches()
-      self.logger.total_train_sent = len(self.corpus_parser.training_corpus.train_src_data)
-      # restart data generation
-      self._augmentation_handle = Popen(augment_command + " --epoch %d" % self.logger.epoch_num, shell=True)
+    """
+    Double-buffered data reload: the reload command and the subsequent reading and batching of its output run in
+    a background task while training continues on the current data. The prepared data is swapped in at the
+    first epoch boundary after the task has finished, and the next reload is started.
+    """
+    if self._reload_task is not None:
+      if not self._reload_task.done():
+        print('new data set is not ready yet, using data from last epoch.')
+        return
+      print('using reloaded data')
+      reading_parser, train_src, train_trg, dev_src, dev_trg = self._reload_task.result()
+      training_corpus = reading_parser.training_corpus
+      self.corpus_parser.training_corpus = training_corpus
+      for attr in ("train_src_len", "train_trg_len", "dev_src_len", "dev_trg_len"):
+        setattr(self.corpus_parser, attr, getattr(reading_parser, attr))
+      self.train_src, self.train_trg, self.dev_src, self.dev_trg = train_src, train_trg, dev_src, dev_trg
+      self._train_batches_used = False
+      if not self.corpus_parser.is_streaming():
+        self.logger.total_train_sent = len(training_corpus.train_src_data)
+    self._reload_task = BackgroundTask(self._reload_data, self.logger.epoch_num, self.corpus_parser.reading_copy(),
+                                       self.batcher.copy_without_cache())
+
+  def _reload_data(self, epoch_num, corpus_parser, batcher):
+    """
+    Run the reload command, then read and pack its output into a copy of the training corpus.
+    Only touches the given parser and batcher, which must not be shared with the training thread; the results
+    are swapped in by the training thread.
+
+    :param epoch_num: epoch number passed to the reload command
+    :param corpus_parser: copy of the corpus parser used for reading
+    :param batcher: batcher used for packing
+    :returns: tuple of the corpus parser (holding the new training corpus), train src/trg batches and dev src/trg batches
+    """
+    self._augmentation_handle = Popen(self.args["reload_command"] + " --epoch %d" % epoch_num, shell=True)
+    self._augmentation_handle.wait()
+    training_corpus = copy.copy(corpus_parser.training_corpus)
+    corpus_parser.training_corpus = training_corpus
+    corpus_parser._read_training_corpus(training_corpus)
+    if corpus_parser.is_streaming():
+      train_src, train_trg = None, None
     else:
-      print('new data set is not ready yet, using data from last epoch.')
+      train_src, train_trg = batcher.pack(training_corpus.train_src_data, training_corpus.train_trg_data)
+    dev_src, dev_trg = batcher.pack(training_corpus.dev_src_data, training_corpus.dev_trg_data)
+    return corpus_parser, train_src, train_trg, dev_src, dev_trg
 
   def run_epochs(self, num_epochs=None):
+    if self.args["inference_only"]:
+      raise RuntimeError("TrainingRegimen was created with inference_only and can't be trained")
+    if self.args["num_processes"] > 1:
+      if self.corpus_parser.is_streaming():
+        raise RuntimeError("data parallel training is not supported when streaming the training corpus")
+      self._data_parallel = DataParallelGroup(self.model_context.dynet_param_collection.param_col,
+                                              self.args["num_processes"])
+      self._data_parallel.start(lambda: self._run_epochs(num_epochs))
+      try:
+        self._run_epochs(num_epochs)
+      except:
+        self._data_parallel.join(raise_on_failure=False)
+        raise
+      else:
+        self._data_parallel.join()
+      finally:
+        self._data_parallel = None
+    else:
+      self._run_epochs(num_epochs)
+
+  def _run_epochs(self, num_epochs):
     epoch_i = 0
     while True:
       self.one_epoch()
@@ -202,12 +308,49 @@ class TrainingRegimen(Serializable):
     if self.args["reload_command"] is not None:
       self._augment_data_next_epoch()
 
+    streaming = self.corpus_parser.is_streaming()
+    if streaming:
+      self.logger.total_train_sent = self.corpus_parser.count_train_sents(self.corpus_parser.training_corpus, self.logger.epoch_num)
+    elif self._train_batches_used and self.args["rebatch_every_epoch"] and self.batcher.is_random():
+      self.pack_train_batches()
+    self._train_batches_used = True
+
     self.model.set_train(update_weights)
-    order = list(range(0, len(self.train_src)))
-    np.random.shuffle(order)
-    for batch_num in order:
-      src = self.train_src[batch_num]
-      trg = self.train_trg[batch_num]
+    self._synced_progress = (0, 0, {})
+    # the batches may be produced in the prefetching thread, so they get their own random state, seeded here
+    train_batches = self.iterate_train_batches(np.random.RandomState(np.random.randint(2**31 - 1)))
+    if self.args["src_transforms"] or self.args["trg_transforms"]:
+      seed = self.args["transform_seed"]
+      transform_rng = np.random.RandomState(np.random.randint(2**31 - 1) if seed is None else seed + self.logger.epoch_num)
+      train_batches = self.transform_batches(train_batches, transform_rng)
+    if self.args["prefetch_batches"] > 0:
+      train_batches = BackgroundIterator(((xnmt.batcher.prepare_batch(src), xnmt.batcher.prepare_batch(trg))
+                                          for src, trg in train_batches),
+                                         max_queued=self.args["prefetch_batches"])
+    try:
+      self.train_on_batches(train_batches, update_weights)
+    finally:
+      if self.args["prefetch_batches"] > 0:
+        train_batches.close()
+    self.apply_accumulated_update()
+    if self._data_parallel is not None:
+      self.sync_data_parallel()
+
+    if streaming and self.logger.sent_num != self.logger.total_train_sent:
+      # the number of sentences surviving the length filter is only known after streaming the whole epoch
+      self.logger.total_train_sent = self.logger.sent_num
+      self.logger.report_train_process()
+      if self.logger.should_report_dev():
+        self.dev_evaluation()
+
+  def train_on_batches(self, train_batches, update_weights=True):
+    """
+    :param train_batches: iterator over (src, trg) training batches
+    :param update_weights: Whether to perform backward pass & update weights
+    """
+    if self._data_parallel is not None:
+      max_batches_per_process = int(math.ceil(len(self.train_src) / self._data_parallel.num_processes))
+    for batch_i, (src, trg) in enumerate(train_batches):
 
       # Loss calculation
       dy.renew_cg()
@@ -233,14 +376,98 @@ class TrainingRegimen(Serializable):
       self.logger.update_epoch_loss(src, trg, loss_builder)
       if update_weights:
         loss_value.backward()
-        self.trainer.update()
+        self._num_accumulated_batches += 1
+        if self._num_accumulated_batches >= self.args["update_every"]:
+          self.apply_accumulated_update()
 
       # Devel reporting
+      if self._data_parallel is not None:
+        # all processes synchronize after the same numbers of batches, even if one has a batch less
+        if (batch_i + 1) % self.args["sync_every"] == 0 and batch_i + 1 < max_batches_per_process:
+          self.sync_data_parallel()
+      else:
+        self.logger.report_train_process()
+        if self.logger.should_report_dev():
+          self.apply_accumulated_update()
+          self.dev_evaluation()
+
+      self.model.new_epoch()
+
+  def sync_data_parallel(self):
+    """
+    Average the model parameters over all data parallel processes. The main process collects the training progress
+    of the other processes, reports it, and runs dev checkpoints; the resulting parameters (which are reverted to the
+    best checkpoint if the trainer was restarted), learning rate, early stopping decision, and whether to restart the
+    trainer are then sent to the other processes.
+    """
+    self.apply_accumulated_update()
+    group = self._data_parallel
+    if group.rank == 0:
+      for sent_num, words, loss_values in group.gather():
+        self.logger.add_progress(sent_num, words, loss_values)
+      group.average_params()
       self.logger.report_train_process()
+      num_times_lr_decayed = self.num_times_lr_decayed
       if self.logger.should_report_dev():
         self.dev_evaluation()
+      restart_trainer = self.args["restart_trainer"] and not self.early_stopping_reached \
+                        and self.num_times_lr_decayed > num_times_lr_decayed
+      group.broadcast((self.trainer.learning_rate, self.early_stopping_reached, restart_trainer))
+    else:
+      synced_sent_num, synced_words, synced_loss_values = self._synced_progress
+      loss_values = dict(self.logger.epoch_loss.loss_values)
+      progress = (self.logger.sent_num - synced_sent_num, self.logger.epoch_words - synced_words,
+                  {name: value - synced_loss_values.get(name, 0.0) for name, value in loss_values.items()})
+      self._synced_progress = (self.logger.sent_num, self.logger.epoch_words, loss_values)
+      self.trainer.learning_rate, self.early_stopping_reached, restart_trainer = group.exchange(progress)
+      if restart_trainer:
+        self.trainer.restart()
+
+  def apply_accumulated_update(self):
+    """
+    Update the parameters with the gradients accumulated since the last update, if any.
+    """
+    if self._num_accumulated_batches > 0:
+      self.trainer.update()
+      self._num_accumulated_batches = 0
 
-      self.model.new_epoch()
+  def transform_batches(self, train_batches, rng):
+    """
+    :param train_batches: iterator over (src, trg) training batches
+    :param rng: numpy RandomState used by the transforms
+    :returns: iterator over (src, trg) batches with src_transforms and trg_transforms applied
+    """
+    for src, trg in train_batches:
+      yield xnmt.augmentation.apply_transforms(src, self.args["src_transforms"], rng), \
+            xnmt.augmentation.apply_transforms(trg, self.args["trg_transforms"], rng)
+
+  def iterate_train_batches(self, rng):
+    """
+    :param rng: numpy RandomState used to shuffle the batch order
+    :returns: iterator over (src, trg) training batches of the current epoch, in random order.
+              In streaming mode, the training corpus is read and packed one window at a time,
+              and the batch order is randomized within each window; batchers that support streaming
+              consume the training sentence pairs directly.
+    """
+    if self.corpus_parser.is_streaming() and hasattr(self.batcher, "pack_stream"):
+      for batch_pair in self.batcher.pack_stream(
+              self.corpus_parser.iterate_training_pairs(self.corpus_parser.training_corpus, self.logger.epoch_num)):
+        yield batch_pair
+      return
+    if self.corpus_parser.is_streaming():
+      windows = (self.batcher.pack(src_sents, trg_sents) for src_sents, trg_sents in
+                 self.corpus_parser.iterate_training_windows(self.corpus_parser.training_corpus, self.logger.epoch_num))
+    else:
+      windows = [(self.train_src, self.train_trg)]
+    for train_src, train_trg in windows:
+      if self._data_parallel is not None:
+        # each process trains on its own fixed share of the batches
+        order = list(range(self._data_parallel.rank, len(train_src), self._data_parallel.num_processes))
+      else:
+        order = list(range(0, len(train_src)))
+      rng.shuffle(order)
+      for batch_num in order:
+        yield train_src[batch_num], train_trg[batch_num]
 
   def dev_evaluation(self, out_ext=".dev_hyp", ref_ext=".dev_ref", encoding='utf-8'):
     self.model.set_train(False)
@@ -250,37 +477,31 @@ class TrainingRegimen(Serializable):
 
     eval_scores = {"loss" : loss_score}
     if len(list(filter(lambda e: e!="loss", self.evaluators))) > 0:
-#       self.xnmt_decoder["src_file"] = self.corpus_parser.training_corpus.dev_src
-#       self.xnmt_decoder["candidate_id_file"] = self.corpus_parser.training_corpus.dev_id_file
       trg_file = None
       if self.args["model_file"]:
         out_file = self.args["model_file"] + out_ext
         out_file_ref = self.args["model_file"] + ref_ext
         trg_file = out_file
+      self._prepare_dev_references(out_file_ref, encoding)
       # Decoding + post_processing
-#       xnmt.xnmt_decode.xnmt_decode(model_elements=(self.corpus_parser, self.model), **self.xnmt_decoder)
       self.xnmt_decoder(src_file = self.corpus_parser.training_corpus.dev_src,
                                    trg_file = trg_file,
                                    candidate_id_file = self.corpus_parser.training_corpus.dev_id_file,
-                                   model_elements=(self.corpus_parser, self.model))
-      output_processor = self.xnmt_decoder.get_output_processor() # TODO: hack, refactor
-      # Copy Trg to Ref
-      processed = []
-      with io.open(self.corpus_parser.training_corpus.dev_trg, encoding=encoding) as fin:
-        for line in fin:
-          processed.append(output_processor.words_to_string(line.strip().split()) + u"\n")
-      with io.open(out_file_ref, 'wt', encoding=encoding) as fout:
-        for line in processed:
-          fout.write(line)
+                                   model_elements=(self.corpus_parser, self.model),
+                                   src_corpus=self._dev_src_corpus)
       # Evaluation
       if self.args["model_file"]:
         self.evaluate_args["hyp_file"] = out_file
         self.evaluate_args["ref_file"] = out_file_ref
       for evaluator in self.evaluators:
         if evaluator=="loss": continue
-        self.evaluate_args["evaluator"] = evaluator
-        eval_score = xnmt.xnmt_evaluate.xnmt_evaluate(**self.evaluate_args)
-        eval_scores[evaluator] = eval_score
+        dev_evaluator = self._get_dev_evaluator(evaluator)
+        if dev_evaluator is None:
+          eval_scores[evaluator] = None
+          continue
+        evaluator_obj, hyp_postprocess, ref_corpus = dev_evaluator
+        hyp_corpus = xnmt.xnmt_evaluate.read_data(self.evaluate_args["hyp_file"], post_process=hyp_postprocess)
+        eval_scores[evaluator] = xnmt.xnmt_evaluate.evaluate_corpora(evaluator_obj, ref_corpus, hyp_corpus)
     # Logging
     if schedule_metric == "loss":
       self.logger.set_dev_score(trg_words_cnt, loss_score)
@@ -319,6 +540,34 @@ class TrainingRegimen(Serializable):
     self.model.set_train(True)
     return
 
+  def _prepare_dev_references(self, out_file_ref, encoding='utf-8'):
+    """
+    Read the dev source sents and post-process the dev references once per training run, writing the
+    references to out_file_ref. Subsequent dev evaluations reuse them from memory.
+    """
+    if self._dev_refs is not None: return
+    self._dev_src_corpus = list(self.corpus_parser.src_reader.read_sents(self.corpus_parser.training_corpus.dev_src))
+    output_processor = self.xnmt_decoder.get_output_processor() # TODO: hack, refactor
+    self._dev_refs = []
+    for line in xnmt.input.iterate_text_lines(self.corpus_parser.training_corpus.dev_trg, encoding=encoding):
+      self._dev_refs.append(output_processor.words_to_string(line.strip().split()) + u"\n")
+    with io.open(out_file_ref, 'wt', encoding=encoding) as fout:
+      for line in self._dev_refs:
+        fout.write(line)
+
+  def _get_dev_evaluator(self, evaluator):
+    """
+    :param evaluator: evaluation metric spec
+    :returns: cached tuple of evaluator, hyp post-processing function and post-processed dev references, or None
+    """
+    if evaluator not in self._dev_evaluators:
+      built_evaluator = xnmt.xnmt_evaluate.build_evaluator(evaluator)
+      if built_evaluator is not None:
+        evaluator_obj, hyp_postprocess, ref_postprocess = built_evaluator
+        built_evaluator = (evaluator_obj, hyp_postprocess, [ref_postprocess(line.strip()) for line in self._dev_refs])
+      self._dev_evaluators[evaluator] = built_evaluator
+    return self._dev_evaluators[evaluator]
+
   def compute_dev_loss(self):
     loss_builder = LossBuilder()
     trg_words_cnt = 0
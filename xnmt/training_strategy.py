@@ -102,13 +102,14 @@ class TrainingReinforceLoss(Serializable):
         sample_i = sample_i[:idx]
       except ValueError:
         pass
+      trg_words = list(trg_i.words)
       try:
-        idx = trg_i.words.index(Vocab.ES)
-        trg_i.words = trg_i.words[:idx]
+        idx = trg_words.index(Vocab.ES)
+        trg_words = trg_words[:idx]
       except ValueError:
         pass
       # Calculate the evaluation score
-      score = 0 if not len(sample_i) else self.evaluation_metric.evaluate_fast(trg_i.words, sample_i)
+      score = 0 if not len(sample_i) else self.evaluation_metric.evaluate_fast(trg_words, sample_i)
       self.eval_score.append(score)
     self.true_score = dy.inputTensor(self.eval_score, batched=True)
     loss = LossBuilder()
@@ -1,4 +1,5 @@
 import io
+import numpy as np
 from xnmt.serializer import Serializable
 
 class Vocab(Serializable):
@@ -62,6 +63,47 @@ class Vocab(Serializable):
       self.i2w.append(w)
     return self.w2i[w]
 
+  def convert_list(self, words, append_es=False):
+    """
+    Convert a sequence of words at once; faster than calling convert() for each word if the vocab is frozen.
+
+    :param words: list of words
+    :param append_es: if True, the id of </s> is appended
+    :returns: list of word ids
+    """
+    unk = getattr(self, "unk_token", None)
+    if self.frozen and unk is not None:
+      get = self.w2i.get
+      ids = [get(w, unk) for w in words]
+    else:
+      ids = [self.convert(w) for w in words]
+    if append_es:
+      ids.append(self.ES)
+    return ids
+
+  def convert_array(self, words, append_es=False):
+    """
+    :param words: list of words
+    :param append_es: if True, the id of </s> is appended
+    :returns: int32 numpy array of word ids
+    """
+    return np.array(self.convert_list(words, append_es), dtype=np.int32)
+
+  def to_words(self, ids, filtered_ids=None):
+    """
+    Convert a sequence of word ids back to words.
+
+    :param ids: list or numpy array of word ids
+    :param filtered_ids: optional set of ids to skip (e.g. <s> and </s>)
+    :returns: list of words
+    """
+    if isinstance(ids, np.ndarray):
+      ids = ids.tolist()
+    i2w = self.i2w
+    if filtered_ids:
+      return [i2w[i] for i in ids if i not in filtered_ids]
+    return [i2w[i] for i in ids]
+
   def __getitem__(self, i):
     return self.i2w[i]
 
@@ -2,6 +2,7 @@
 
 import io
 import sys
+import yaml
 
 import dynet as dy
 
@@ -11,7 +12,8 @@ from xnmt.retriever import *
 from xnmt.translator import *
 from xnmt.search_strategy import *
 from xnmt.options import OptionParser, Option
-from xnmt.serializer import Serializable
+from xnmt.serializer import Serializable, YamlSerializer, UninitializedYamlObject
+from xnmt.model_context import ModelContext, PersistentParamCollection
 
 '''
 This will be the main class to perform decoding.
@@ -19,6 +21,34 @@ This will be the main class to perform decoding.
 
 NO_DECODING_ATTEMPTED = u"@@NO_DECODING_ATTEMPTED@@"
 
+def load_inference_model(model_file):
+  """
+  Load a model saved during training for decoding, without reading any training or dev data.
+
+  The saved TrainingRegimen is initialized in inference-only mode, i.e. the input readers are created from
+  the vocabs stored in the saved model and the model parameters are loaded from <model_file>.data.
+
+  :param model_file: model file written during training
+  :returns: tuple (corpus_parser, generator), as expected by XnmtDecoder's model_elements
+  """
+  import xnmt.train # registers all Serializable classes with the YAML parser; can't be imported at module level
+  try:
+    with open(model_file) as stream:
+      saved_obj = yaml.load(stream)
+  except IOError as e:
+    raise RuntimeError("Could not read model file {}: {}".format(model_file, e))
+  saved_obj.corpus_parser.lazy_read = True
+  saved_obj.inference_only = True
+  saved_obj.reload_command = None
+  saved_obj.pretrained_model_file = ""
+  model_context = ModelContext()
+  model_context.dynet_param_collection = PersistentParamCollection(model_file, 1)
+  for k, v in getattr(saved_obj, "glob", {}).items():
+    setattr(model_context, k, v)
+  training_regimen = YamlSerializer().initialize_if_needed(UninitializedYamlObject(saved_obj), model_context)
+  model_context.dynet_param_collection.load_from_data_file(model_file + '.data')
+  return training_regimen.corpus_parser, training_regimen.model
+
 class XnmtDecoder(Serializable):
   yaml_tag = u'!XnmtDecoder'
   def __init__(self, model_file=None, src_file=None, trg_file=None, ref_file=None, max_src_len=None,
@@ -54,29 +84,21 @@ class XnmtDecoder(Serializable):
     self.mode = mode
     
 
-  def __call__(self, src_file=None, trg_file=None, candidate_id_file=None, model_elements=None):
+  def __call__(self, src_file=None, trg_file=None, candidate_id_file=None, model_elements=None, src_corpus=None):
     """
     :param src_file: path of input src file to be translated
     :param trg_file: path of file where trg translatons will be written
     :param candidate_id_file: if we are doing something like retrieval where we select from fixed candidates, sometimes we want to limit our candidates to a certain subset of the full set. this setting allows us to do this.
     :param model_elements: If None, the model will be loaded from model_file. If set, should equal (corpus_parser, generator).
+    :param src_corpus: already read src sents; if given, these are translated instead of reading src_file
     """
     if model_elements is None:
-      raise RuntimeError("xnmt_decode with model_element=None needs to be updated to run with the new YamlSerializer")
-  #    TODO: These lines need to be updated / removed!
-  #    model = dy.Model()
-  #    model_serializer = JSONSerializer()
-  #    serialize_container = model_serializer.load_from_file(args.model_file, model)
-  #
-  #    src_vocab = Vocab(serialize_container.src_vocab)
-  #    trg_vocab = Vocab(serialize_container.trg_vocab)
-  #
-  #    generator = DefaultTranslator(serialize_container.src_embedder, serialize_container.encoder,
-  #                                  serialize_container.attender, serialize_container.trg_embedder,
-  #                                  serialize_container.decoder)
-  #
-    else:
-      corpus_parser, generator = model_elements
+      if self.model_file is None:
+        raise RuntimeError("XnmtDecoder needs either model_elements or a model_file to load the model from")
+      if getattr(self, "_loaded_model_elements", None) is None:
+        self._loaded_model_elements = load_inference_model(self.model_file)
+      model_elements = self._loaded_model_elements
+    corpus_parser, generator = model_elements
     
     args = dict(model_file=self.model_file, src_file=src_file or self.src_file, trg_file=trg_file or self.trg_file, ref_file=self.ref_file, max_src_len=self.max_src_len,
                   input_format=self.input_format, post_process=self.post_process, candidate_id_file=candidate_id_file, report_path=self.report_path, report_type=self.report_type,
@@ -84,7 +106,8 @@ class XnmtDecoder(Serializable):
   
     is_reporting = issubclass(generator.__class__, Reportable) and args["report_path"] is not None
     # Corpus
-    src_corpus = list(corpus_parser.src_reader.read_sents(args["src_file"]))
+    if src_corpus is None:
+      src_corpus = list(corpus_parser.src_reader.read_sents(args["src_file"]))
     # Get reference if it exists and is necessary
     if args["mode"] == "forced" or args["mode"] == "forceddebug":
       if args["ref_file"] == None:
@@ -3,7 +3,7 @@ import sys
 import io
 import ast
 
-from xnmt.evaluator import BLEUEvaluator, GLEUEvaluator, WEREvaluator, CEREvaluator, RecallEvaluator, ExternalEvaluator
+from xnmt.evaluator import BLEUEvaluator, GLEUEvaluator, WEREvaluator, CEREvaluator, RecallEvaluator, ExternalEvaluator, MeanAvgPrecisionEvaluator
 from xnmt.options import OptionParser
 from xnmt.xnmt_decode import NO_DECODING_ATTEMPTED
 
@@ -25,14 +25,14 @@ def eval_or_empty_list(x):
   except:
     return []
 
-def xnmt_evaluate(ref_file=None, hyp_file=None, evaluator="bleu"):
-  """"Returns the eval score (e.g. BLEU) of the hyp sents using reference trg sents
-  :param ref_file: path of the reference file
-  :param hyp_file: path of the hypothesis trg file
-  :param evaluator: Evaluation metrics (bleu/wer/cer)
+def build_evaluator(evaluator="bleu"):
+  """Creates the evaluator for the given evaluation metric, together with the functions to post-process
+  hypothesis and reference lines with
+  :param evaluator: Evaluation metrics (bleu/wer/cer), optionally followed by parameters, e.g. "bleu|ngram=2"
+  :returns: tuple of evaluator, hypothesis post-processing function, reference post-processing function;
+            None if the evaluation metric can't be used
   """
-  args = dict(ref_file=ref_file, hyp_file=hyp_file, evaluator=evaluator)
-  cols = args["evaluator"].split("|")
+  cols = evaluator.split("|")
   eval_type  = cols[0]
   eval_param = {} if len(cols) == 1 else {key: value for key, value in [param.split("=") for param in cols[1].split()]}
 
@@ -70,15 +70,37 @@ def xnmt_evaluate(ref_file=None, hyp_file=None, evaluator="bleu"):
   else:
     raise RuntimeError("Unknown evaluation metric {}".format(eval_type))
 
-  ref_corpus = read_data(args["ref_file"], post_process=ref_postprocess)
-  hyp_corpus = read_data(args["hyp_file"], post_process=hyp_postprocess)
-  len_before = len(hyp_corpus)
-  ref_corpus, hyp_corpus = zip(*filter(lambda x: NO_DECODING_ATTEMPTED not in x[1], zip(ref_corpus, hyp_corpus)))
-  if len(ref_corpus) < len_before:
+  return evaluator, hyp_postprocess, ref_postprocess
+
+def evaluate_corpora(evaluator, ref_corpus, hyp_corpus):
+  """Returns the eval score of already post-processed hypotheses, ignoring sentences for which no decoding was attempted
+  :param evaluator: evaluator as returned by build_evaluator()
+  :param ref_corpus: list of post-processed reference sents; evaluators may cache statistics of the reference corpus
+                     if the same list is passed again
+  :param hyp_corpus: list of post-processed hypothesis sents
+  """
+  if any(NO_DECODING_ATTEMPTED in hyp for hyp in hyp_corpus):
+    len_before = len(hyp_corpus)
+    ref_corpus, hyp_corpus = zip(*filter(lambda x: NO_DECODING_ATTEMPTED not in x[1], zip(ref_corpus, hyp_corpus)))
     print("> ignoring %s out of %s test sentences." % (len_before - len(ref_corpus), len_before))
 
-  eval_score = evaluator.evaluate(ref_corpus, hyp_corpus)
-  return eval_score
+  return evaluator.evaluate(ref_corpus, hyp_corpus)
+
+def xnmt_evaluate(ref_file=None, hyp_file=None, evaluator="bleu"):
+  """"Returns the eval score (e.g. BLEU) of the hyp sents using reference trg sents
+  :param ref_file: path of the reference file
+  :param hyp_file: path of the hypothesis trg file
+  :param evaluator: Evaluation metrics (bleu/wer/cer)
+  """
+  args = dict(ref_file=ref_file, hyp_file=hyp_file, evaluator=evaluator)
+  built_evaluator = build_evaluator(args["evaluator"])
+  if built_evaluator is None:
+    return None
+  evaluator, hyp_postprocess, ref_postprocess = built_evaluator
+
+  ref_corpus = read_data(args["ref_file"], post_process=ref_postprocess)
+  hyp_corpus = read_data(args["hyp_file"], post_process=hyp_postprocess)
+  return evaluate_corpora(evaluator, ref_corpus, hyp_corpus)
 
 if __name__ == "__main__":
 
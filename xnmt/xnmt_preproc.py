@@ -5,6 +5,8 @@ import io
 
 from xnmt.options import OptionParser
 from xnmt.preproc import Normalizer, SentenceFilterer, VocabFilterer
+from xnmt.input import compile_binary_corpus, compile_feature_store
+from xnmt.vocab import Vocab
 from xnmt.serializer import YamlSerializer, UninitializedYamlObject
 
 ##### Main function
@@ -15,7 +17,7 @@ def xnmt_preproc(preproc_specs=None, overwrite=False):
                                The types of arguments that preproc_spec expects:
                                      Option("in_files", help_str="list of paths to the input files"),
                                      Option("out_files", help_str="list of paths for the output files"),
-                                     Option("type", help_str="type of preprocessing (normalize,filter,vocab)"),
+                                     Option("type", help_str="type of preprocessing (normalize,filter,vocab,binarize,binarize_feats)"),
                                      Option("spec", help_str="The specifications describing which type of processing to use. For normalize and vocab, should consist of the 'lang' and 'spec', where 'lang' can either be 'all' to apply the same type of processing to all languages, or a zero-indexed integer indicating which language to process."),
   :param overwrite (bool): Whether to overwrite files if they already exist.
   """
@@ -98,6 +100,24 @@ def xnmt_preproc(preproc_specs=None, overwrite=False):
             for word in vocab.keys():
               out_stream.write((word + u"\n"))
 
+    # Compile text into binary word id files that can be read by a BinaryIdReader
+    elif arg["type"] == 'binarize':
+      vocab_files = {my_opts["filenum"]: my_opts["vocab_file"] for my_opts in arg["specs"]}
+      for i, (in_file, out_file) in enumerate(zip(arg["in_files"], arg["out_files"])):
+        if args["overwrite"] or not os.path.isfile(out_file + ".ids.npy"):
+          vocab_file = vocab_files.get(i, vocab_files.get("all"))
+          if vocab_file is None:
+            raise RuntimeError("binarize requires a vocab_file for input file %s (filenum %s or 'all')" % (in_file, i))
+          compile_binary_corpus(in_file, out_file, Vocab(vocab_file=vocab_file))
+
+    # Compile .npz feature archives into memory-mappable feature stores that can be read by a MmapContVecReader
+    elif arg["type"] == 'binarize_feats':
+      feat_opts = {my_opts["filenum"]: my_opts for my_opts in arg.get("specs") or []}
+      for i, (in_file, out_file) in enumerate(zip(arg["in_files"], arg["out_files"])):
+        if args["overwrite"] or not os.path.isfile(out_file + ".feats.npy"):
+          my_opts = feat_opts.get(i, feat_opts.get("all", {}))
+          compile_feature_store(in_file, out_file, transpose=my_opts.get("transpose", False), dtype=my_opts.get("dtype", "float32"))
+
     else:
       raise RuntimeError("Unknown preprocessing type {}".format(arg['type']))
 
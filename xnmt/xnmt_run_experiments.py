@@ -83,15 +83,22 @@ def main(overwrite_args=None):
     print("> Preprocessing")
     xnmt.xnmt_preproc.xnmt_preproc(**preproc_args)
 
-    print("> Initializing TrainingRegimen")
     train_args = exp_tasks["train"]
     train_args.model_file = exp_args["model_file"] # TODO: can we use param sharing for this?
     model_context = ModelContext()
-    model_context.dynet_param_collection = PersistentParamCollection(exp_args["model_file"], 1)
-    if hasattr(train_args, "glob"):
-      for k in train_args.glob:
-        setattr(model_context, k, train_args.glob[k])
-    train_args = YamlSerializer().initialize_if_needed(UninitializedYamlObject(train_args), model_context)
+    if exp_args["eval_only"] and os.path.isfile(exp_args["model_file"]):
+      # evaluating a trained model: skip reading the training corpus
+      print("> Loading trained model from %s" % exp_args["model_file"])
+      model_elements = xnmt.xnmt_decode.load_inference_model(exp_args["model_file"])
+      training_regimen = None
+    else:
+      print("> Initializing TrainingRegimen")
+      model_context.dynet_param_collection = PersistentParamCollection(exp_args["model_file"], 1)
+      if hasattr(train_args, "glob"):
+        for k in train_args.glob:
+          setattr(model_context, k, train_args.glob[k])
+      training_regimen = YamlSerializer().initialize_if_needed(UninitializedYamlObject(train_args), model_context)
+      model_elements = (training_regimen.corpus_parser, training_regimen.model)
     
     xnmt_decoder = exp_tasks.get("decode", {})
     xnmt_decoder.trg_file = exp_args["hyp_file"] # TODO: can we use param sharing for this?
@@ -109,22 +116,19 @@ def main(overwrite_args=None):
     if "random_search_report" in exp_tasks:
       print("> instantiated random parameter search: %s" % exp_tasks["random_search_report"])
 
-    print("> Training")
-    training_regimen = train_args
-    training_regimen.xnmt_decoder = copy.copy(xnmt_decoder)
-    training_regimen.evaluate_args = copy.copy(evaluate_args)
-
     eval_scores = "Not evaluated"
     if not exp_args["eval_only"]:
+      print("> Training")
+      training_regimen.xnmt_decoder = copy.copy(xnmt_decoder)
+      training_regimen.evaluate_args = copy.copy(evaluate_args)
       training_regimen.run_epochs(exp_args["run_for_epochs"])
 
-    if not exp_args["eval_only"]:
       print('reverting learned weights to best checkpoint..')
       training_regimen.model_context.dynet_param_collection.revert_to_best_model()
     if evaluators:
       print("> Evaluating test set")
       output.indent += 2
-      xnmt_decoder(model_elements=(training_regimen.corpus_parser, training_regimen.model))
+      xnmt_decoder(model_elements=model_elements)
       eval_scores = []
       for evaluator in evaluators:
         evaluate_args["evaluator"] = evaluator